@@ -1,11 +1,13 @@
 import streamlit as st
 import requests
 import json
+import os
 import random
+import threading
 import time
-from PIL import Image
-import io
-import base64
+import tomllib
+from collections import deque
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 # App configuration
 st.set_page_config(
@@ -36,59 +38,862 @@ def get_secrets():
 
 tmdb_api_key, gemini_api_key = get_secrets()
 
-# Use direct API requests for Gemini instead of the SDK
-def call_gemini_api(prompt):
-    """Call Gemini API directly using requests instead of the SDK"""
+# Optional key for the OpenAI-compatible backend; local servers usually need none
+def get_openai_api_key():
     try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={gemini_api_key}"
-        headers = {'Content-Type': 'application/json'}
-        data = {
-            "contents": [{
-                "parts": [{"text": prompt}]
-            }],
-            "generationConfig": {
-                "temperature": 0.9,
-                "topP": 1,
-                "topK": 32,
-                "maxOutputTokens": 4096
-            }
-        }
-        
-        response = requests.post(url, headers=headers, json=data)
-        
-        # Check for API errors
-        if response.status_code != 200:
-            st.error(f"Gemini API error: {response.status_code} - {response.text}")
+        return st.secrets.get("openai_api_key")
+    except Exception:
+        return None
+
+openai_api_key = get_openai_api_key()
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.toml")
+
+def positive(value):
+    return value > 0
+
+def non_negative(value):
+    return value >= 0
+
+def between(low, high):
+    return lambda value: low <= value <= high
+
+def one_of(*choices):
+    return lambda value: value in choices
+
+def backend_list(value):
+    return bool(value) and all(backend in ("gemini", "openai", "template") for backend in value)
+
+# Typed schema for config.toml: section -> key -> (type, default, validator)
+CONFIG_SCHEMA = {
+    "app": {
+        "name": (str, "SVOMO RECOMMENDATION", None),
+        "version": (str, "1.1.0", None),
+        "description": (str, "", None),
+        "author": (str, "", None)
+    },
+    "design": {
+        "theme": (str, "retro-futuristic", None),
+        "primary_color": (str, "#00ffcc", None),
+        "secondary_color": (str, "#ff00aa", None),
+        "background": (str, "gradient", one_of("gradient", "solid", "dark")),
+        "animation": (bool, True, None),
+        "debug_mode": (bool, False, None)
+    },
+    "api": {
+        "tmdb_base_url": (str, "https://api.themoviedb.org/3", None),
+        "gemini_model": (str, "gemini-2.0-flash", None),
+        "fallback_delay": (int, 500, non_negative)
+    },
+    "recommendations": {
+        "max_recommendations": (int, 3, between(1, 10)),
+        "candidate_pool_size": (int, 30, between(1, 100)),
+        "search_expansions": (bool, True, None),
+        "include_explanation": (bool, True, None),
+        "include_genres": (bool, True, None),
+        "include_overview": (bool, True, None),
+        "poster_size": (str, "w342", None)
+    },
+    "anime": {
+        "special_handling": (bool, True, None),
+        "add_anime_keyword": (bool, True, None),
+        "try_alternate_titles": (bool, True, None),
+        "japanese_titles_fallback": (bool, True, None)
+    },
+    "questions": {
+        "persona_count": (int, 4, between(1, 10)),
+        "mood_count": (int, 4, between(1, 10)),
+        "step_by_step": (bool, True, None)
+    },
+    "llm": {
+        "question_route": (list, ["gemini", "template"], backend_list),
+        "recommendation_route": (list, ["gemini", "openai", "template"], backend_list),
+        "openai_base_url": (str, "", None),
+        "openai_model": (str, "local-model", None),
+        "latency_budget_ms": (int, 8000, positive),
+        "max_error_rate": (float, 0.5, between(0, 1)),
+        "window": (int, 50, positive),
+        "min_samples": (int, 5, positive),
+        "sample_max_age_seconds": (int, 600, positive),
+        "probe_seconds": (int, 60, positive)
+    },
+    "catalog": {
+        "snapshot_path": (str, "", None),
+        "publish_quick_picks": (bool, False, None)
+    },
+    "admission": {
+        "enabled": (bool, True, None),
+        "max_concurrent": (int, 4, positive),
+        "max_queue": (int, 16, non_negative),
+        "max_wait_seconds": (float, 20.0, positive),
+        "host_slots_dir": (str, "", None),
+        "host_max_concurrent": (int, 8, positive)
+    },
+    "profiles": {
+        "enabled": (bool, True, None),
+        "path": (str, "profiles.db", None),
+        "bloom_bits": (int, 16384, between(1024, 1 << 20)),
+        "bloom_hashes": (int, 5, between(1, 16)),
+        "recent_titles": (int, 50, non_negative)
+    },
+    "quick_picks": {
+        "enabled": (bool, True, None),
+        "refresh_seconds": (int, 1800, between(60, 24 * 60 * 60)),
+        "per_segment": (int, 20, positive)
+    },
+    "performance": {
+        "http_pool_connections": (int, 4, positive),
+        "http_pool_maxsize": (int, 16, positive),
+        "connect_timeout": (float, 3.05, positive),
+        "read_timeout": (float, 20.0, positive),
+        "max_concurrent_requests": (int, 4, positive),
+        "cache_ttl_seconds": (int, 3600, positive),
+        "cache_max_entries": (int, 256, positive)
+    }
+}
+
+# Check types and ranges, fill in defaults and reject unknown keys
+def validate_config(raw):
+    config = {}
+    problems = []
+    for section, keys in CONFIG_SCHEMA.items():
+        values = raw.get(section, {})
+        if not isinstance(values, dict):
+            problems.append(f"[{section}] must be a table, got {values!r}")
+            values = {}
+        for key in values.keys() - keys.keys():
+            problems.append(f"[{section}] unknown setting '{key}'")
+        config[section] = {}
+        for key, (kind, default, check) in keys.items():
+            value = values.get(key, default)
+            # TOML integers are fine where floats are expected; bools are never numbers
+            if kind is float and isinstance(value, int) and not isinstance(value, bool):
+                value = float(value)
+            if not isinstance(value, kind) or (kind is not bool and isinstance(value, bool)):
+                problems.append(f"[{section}] {key} must be {kind.__name__}, got {value!r}")
+            elif check and not check(value):
+                problems.append(f"[{section}] {key} has invalid value {value!r}")
+            config[section][key] = value
+    for section in raw.keys() - CONFIG_SCHEMA.keys():
+        problems.append(f"unknown section [{section}]")
+    if problems:
+        raise ValueError("Invalid config.toml: " + "; ".join(problems))
+    return config
+
+# Parse and validate a config file
+def load_config_file(path):
+    with open(path, "rb") as f:
+        return validate_config(tomllib.load(f))
+
+# Last config that validated, shared by all sessions in this process
+@st.cache_resource(show_spinner=False)
+def last_good_config():
+    # mtime_ns is the file behind `config`; error_mtime_ns/error remember a
+    # rejected file so it is parsed once
+    return {
+        "lock": threading.Lock(),
+        "config": validate_config({}),
+        "mtime_ns": None,
+        "error_mtime_ns": None,
+        "error": None
+    }
+
+# Current config. config.toml is re-read whenever it changes on disk, so
+# settings can be tuned without a restart; an invalid edit keeps the last
+# good config in place and is reported once per run by main(). This runs on
+# hot paths and worker threads, so an unchanged file costs one stat().
+def get_config():
+    state = last_good_config()
+    try:
+        mtime_ns = os.stat(CONFIG_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return state["config"]
+    if mtime_ns in (state["mtime_ns"], state["error_mtime_ns"]):
+        return state["config"]
+    with state["lock"]:
+        # Another thread may have loaded it while we waited
+        if mtime_ns not in (state["mtime_ns"], state["error_mtime_ns"]):
+            try:
+                state["config"] = load_config_file(CONFIG_PATH)
+                state["mtime_ns"], state["error_mtime_ns"], state["error"] = mtime_ns, None, None
+            except (ValueError, tomllib.TOMLDecodeError) as e:
+                state["error_mtime_ns"], state["error"] = mtime_ns, str(e)
+        return state["config"]
+
+# Shared HTTP session so TMDB and Gemini calls reuse pooled keep-alive
+# connections; changing the pool sizes in config.toml builds a new session
+@st.cache_resource(show_spinner=False)
+def build_http_session(pool_connections, pool_maxsize):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    return session
+
+def get_http_session():
+    performance = get_config()["performance"]
+    return build_http_session(performance["http_pool_connections"], performance["http_pool_maxsize"])
+
+def get_timeout():
+    performance = get_config()["performance"]
+    return (performance["connect_timeout"], performance["read_timeout"])
+
+# Process-wide TMDB caches with TTL and LRU eviction, sized from config.toml.
+# TMDB data is the same for every user, so sessions (and the worker threads
+# that enrich pages for them) share one copy.
+@st.cache_resource(show_spinner=False)
+def shared_caches():
+    return {"lock": threading.Lock(), "caches": {}}
+
+def cache_get(name, key):
+    ttl = get_config()["performance"]["cache_ttl_seconds"]
+    shared = shared_caches()
+    with shared["lock"]:
+        cache = shared["caches"].setdefault(name, {})
+        entry = cache.get(key)
+        if entry is None:
             return None
-            
-        response_data = response.json()
-        
-        # Extract the text from the response
-        if 'candidates' in response_data and len(response_data['candidates']) > 0:
-            candidate = response_data['candidates'][0]
-            if 'content' in candidate and 'parts' in candidate['content']:
-                for part in candidate['content']['parts']:
-                    if 'text' in part:
-                        return part['text']
+        stored_at, value = entry
+        if time.time() - stored_at > ttl:
+            del cache[key]
+            return None
+        # Move to the end so eviction drops the least recently used entry
+        cache[key] = cache.pop(key)
+        return value
+
+def cache_put(name, key, value):
+    max_entries = get_config()["performance"]["cache_max_entries"]
+    shared = shared_caches()
+    with shared["lock"]:
+        cache = shared["caches"].setdefault(name, {})
+        cache.pop(key, None)
+        cache[key] = (time.time(), value)
+        while len(cache) > max_entries:
+            del cache[next(iter(cache))]
+
+# Worker threads have no script context and must not touch session state.
+# The session's stats dicts are handed to them through this thread-local.
+worker_state = threading.local()
+
+def has_script_context():
+    return get_script_run_ctx(suppress_warning=True) is not None
+
+def session_stats(name):
+    stats = getattr(worker_state, name, None)
+    if stats is None and has_script_context():
+        stats = st.session_state.setdefault(name, {})
+    return stats
+
+# Prefetch threads keep updating a session's stats after its script run has
+# moved on, so writes and reads of the stats dicts go through this lock
+@st.cache_resource(show_spinner=False)
+def stats_lock():
+    return threading.Lock()
+
+# Copy of this session's stats, safe to iterate while workers record
+def stats_snapshot(name):
+    with stats_lock():
+        return {key: dict(entry) for key, entry in st.session_state.get(name, {}).items()}
+
+# Built-in questions, used until (or instead of) model-generated ones
+FALLBACK_PERSONA_QUESTIONS = [
+    {
+        "id": "content_type",
+        "text": "Do you prefer watching anime or movies?",
+        "options": ["Anime", "Movies", "Both equally"]
+    },
+    {
+        "id": "preferred_genres",
+        "text": "Which genres do you usually enjoy watching?",
+        "options": ["Action/Adventure", "Drama/Romance", "Comedy", "Sci-Fi/Fantasy"]
+    },
+    {
+        "id": "language_preference",
+        "text": "Which language content do you prefer?",
+        "options": ["English", "Japanese", "Korean", "Bollywood/Hindi", "Multiple languages"]
+    },
+    {
+        "id": "viewing_frequency",
+        "text": "How often do you watch movies or shows?",
+        "options": ["Daily", "Few times a week", "Weekends only", "Occasionally"]
+    }
+]
+
+FALLBACK_MOOD_QUESTIONS = [
+    {
+        "id": "social_context",
+        "text": "Who are you watching with?",
+        "options": ["Alone", "With friend(s)", "With family", "With partner"]
+    },
+    {
+        "id": "current_mood",
+        "text": "What's your current mood?",
+        "options": ["Happy/Excited", "Relaxed/Chill", "Sad/Emotional", "Thoughtful/Introspective"]
+    },
+    {
+        "id": "available_time",
+        "text": "How much time do you have available?",
+        "options": ["Under 2 hours", "2-3 hours", "Multiple sessions", "Binge-watch a series"]
+    },
+    {
+        "id": "content_theme",
+        "text": "What theme are you interested in right now?",
+        "options": ["Love/Romance", "Action/Excitement", "Mystery/Suspense", "Escapism/Fantasy"]
+    }
+]
+
+# Default recommendations in case of API failure
+FALLBACK_RECOMMENDATIONS = [
+    {
+        "title": "The Matrix",
+        "year": "1999",
+        "type": "movie",
+        "explanation": "A classic sci-fi film with groundbreaking visual effects and a thought-provoking story."
+    },
+    {
+        "title": "Stranger Things",
+        "year": "2016",
+        "type": "show",
+        "explanation": "A nostalgic sci-fi series with great characters and supernatural mysteries."
+    },
+    {
+        "title": "Spirited Away",
+        "year": "2001",
+        "type": "anime",
+        "explanation": "A beautifully animated fantasy film with rich storytelling and captivating visuals."
+    }
+]
+
+FALLBACK_ANIME_RECOMMENDATIONS = [
+    {
+        "title": "My Hero Academia",
+        "year": "2016",
+        "type": "anime",
+        "explanation": "A popular anime about superheroes with great action and character development."
+    },
+    {
+        "title": "Your Name",
+        "year": "2016",
+        "type": "anime",
+        "explanation": "A beautiful anime film with stunning visuals and an emotional story."
+    },
+    {
+        "title": "Attack on Titan",
+        "year": "2013",
+        "type": "anime",
+        "explanation": "An intense, dark anime with incredible action sequences and a gripping plot."
+    }
+]
+
+# Catalog for the offline template backend; tags are matched against the answers
+OFFLINE_CATALOG = [
+    {"title": "Spirited Away", "year": "2001", "type": "anime", "tags": ["fantasy", "family", "escapism", "japanese", "relaxed"],
+     "explanation": "A beautifully animated fantasy film with rich storytelling and captivating visuals."},
+    {"title": "Your Name", "year": "2016", "type": "anime", "tags": ["romance", "love", "drama", "emotional", "japanese"],
+     "explanation": "A beautiful anime film with stunning visuals and an emotional story."},
+    {"title": "My Hero Academia", "year": "2016", "type": "anime", "tags": ["action", "adventure", "excited", "friend", "binge"],
+     "explanation": "A popular anime about superheroes with great action and character development."},
+    {"title": "Attack on Titan", "year": "2013", "type": "anime", "tags": ["action", "suspense", "dark", "binge", "thoughtful"],
+     "explanation": "An intense, dark anime with incredible action sequences and a gripping plot."},
+    {"title": "K-On!", "year": "2009", "type": "anime", "tags": ["comedy", "happy", "relaxed", "chill", "friend"],
+     "explanation": "A gentle slice-of-life comedy that is easy to relax into."},
+    {"title": "Death Note", "year": "2006", "type": "anime", "tags": ["mystery", "suspense", "thoughtful", "introspective", "binge"],
+     "explanation": "A tense battle of wits with a mystery that keeps you guessing."},
+    {"title": "Cowboy Bebop", "year": "1998", "type": "anime", "tags": ["sci-fi", "action", "adventure", "multiple sessions"],
+     "explanation": "Stylish space-western episodes that mix action with melancholy."},
+    {"title": "The Matrix", "year": "1999", "type": "movie", "tags": ["sci-fi", "action", "excitement", "english", "thoughtful"],
+     "explanation": "A classic sci-fi film with groundbreaking visual effects and a thought-provoking story."},
+    {"title": "Stranger Things", "year": "2016", "type": "show", "tags": ["sci-fi", "mystery", "suspense", "binge", "friend"],
+     "explanation": "A nostalgic sci-fi series with great characters and supernatural mysteries."},
+    {"title": "Paddington 2", "year": "2017", "type": "movie", "tags": ["comedy", "family", "happy", "under 2 hours"],
+     "explanation": "A warm, funny film the whole family can enjoy."},
+    {"title": "Before Sunrise", "year": "1995", "type": "movie", "tags": ["romance", "love", "partner", "drama", "introspective"],
+     "explanation": "An intimate, talk-driven romance that suits a quiet evening for two."},
+    {"title": "Knives Out", "year": "2019", "type": "movie", "tags": ["mystery", "suspense", "comedy", "friend", "2-3 hours"],
+     "explanation": "A witty whodunit with a twisty plot and a great ensemble cast."},
+    {"title": "Parasite", "year": "2019", "type": "movie", "tags": ["korean", "drama", "suspense", "thoughtful", "multiple languages"],
+     "explanation": "A sharp Korean thriller about class that keeps surprising you."},
+    {"title": "3 Idiots", "year": "2009", "type": "movie", "tags": ["bollywood", "hindi", "comedy", "drama", "friend"],
+     "explanation": "A funny, heartfelt Bollywood story about friendship and ambition."},
+    {"title": "Mad Max: Fury Road", "year": "2015", "type": "movie", "tags": ["action", "adventure", "excitement", "excited", "english"],
+     "explanation": "A relentless, spectacular chase film with non-stop action."},
+    {"title": "The Lord of the Rings: The Fellowship of the Ring", "year": "2001", "type": "movie", "tags": ["fantasy", "adventure", "escapism", "2-3 hours"],
+     "explanation": "An epic fantasy adventure to get lost in."},
+    {"title": "Crash Landing on You", "year": "2019", "type": "show", "tags": ["korean", "romance", "love", "comedy", "binge"],
+     "explanation": "A charming Korean romance series made for binge-watching."},
+    {"title": "Sherlock", "year": "2010", "type": "show", "tags": ["mystery", "suspense", "english", "multiple sessions"],
+     "explanation": "Clever, fast-paced mysteries in feature-length episodes."}
+]
+
+# Generation settings used when a caller does not size its own output
+DEFAULT_GENERATION_CONFIG = {
+    "temperature": 0.9,
+    "topP": 1,
+    "topK": 32,
+    "maxOutputTokens": 4096
+}
+
+# Record latency and token usage per call type, prompt version and backend
+def record_llm_call(call_type, latency_seconds, usage, ok):
+    stats = session_stats("llm_stats")
+    if stats is None:
+        return
+    with stats_lock():
+        entry = stats.setdefault(call_type, {
+            "calls": 0, "failures": 0, "latency_ms": 0.0, "input_tokens": 0, "output_tokens": 0
+        })
+        entry["calls"] += 1
+        entry["latency_ms"] += latency_seconds * 1000
+        entry["input_tokens"] += usage.get("input_tokens", 0)
+        entry["output_tokens"] += usage.get("output_tokens", 0)
+        if not ok:
+            entry["failures"] += 1
+
+# LLM backends all take a request dict (prompt, generation_config,
+# response_schema, name, fields) and return (text, usage); they raise
+# RuntimeError when the call fails so the router can fail over.
+
+# Use direct API requests for Gemini instead of the SDK
+def gemini_backend(request):
+    """Call Gemini API directly using requests instead of the SDK"""
+    if not gemini_api_key:
+        raise RuntimeError("Gemini API key not properly configured")
+    model = get_config()["api"]["gemini_model"]
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={gemini_api_key}"
+    headers = {'Content-Type': 'application/json'}
+    config = dict(request["generation_config"] or DEFAULT_GENERATION_CONFIG)
+    if request["response_schema"]:
+        # Structured output: the model returns bare JSON matching the schema
+        config["responseMimeType"] = "application/json"
+        config["responseSchema"] = request["response_schema"]
+    data = {
+        "contents": [{
+            "parts": [{"text": request["prompt"]}]
+        }],
+        "generationConfig": config
+    }
+    
+    response = get_http_session().post(url, headers=headers, json=data, timeout=get_timeout())
+    
+    # Check for API errors
+    if response.status_code != 200:
+        raise RuntimeError(f"Gemini API error: {response.status_code} - {response.text}")
         
-        st.error("Unexpected response format from Gemini API")
-        return None
-    except Exception as e:
-        st.error(f"Failed to call Gemini API: {str(e)}")
-        return None
+    response_data = response.json()
+    metadata = response_data.get("usageMetadata", {})
+    usage = {
+        "input_tokens": metadata.get("promptTokenCount", 0),
+        "output_tokens": metadata.get("candidatesTokenCount", 0)
+    }
+    
+    # Extract the text from the response
+    if 'candidates' in response_data and len(response_data['candidates']) > 0:
+        candidate = response_data['candidates'][0]
+        if 'content' in candidate and 'parts' in candidate['content']:
+            for part in candidate['content']['parts']:
+                if 'text' in part:
+                    return part['text'], usage
+    
+    raise RuntimeError("Unexpected response format from Gemini API")
 
 # Test the Gemini API on initialization
 def initialize_gemini():
     if not gemini_api_key or gemini_api_key == "YOUR_GEMINI_API_KEY_HERE":
         st.error("Gemini API key not properly configured")
         return False
-        
-    test_response = call_gemini_api("Hello")
-    if test_response:
-        return True
-    return False
+    
+    request = {
+        "prompt": "Hello",
+        "generation_config": {"maxOutputTokens": 16},
+        "response_schema": None,
+        "name": "healthcheck",
+        "fields": {}
+    }
+    start = time.perf_counter()
+    try:
+        gemini_backend(request)
+    except Exception as e:
+        record_backend_sample("gemini", "questions", time.perf_counter() - start, False)
+        st.error(f"Failed to call Gemini API: {str(e)}")
+        return False
+    # A one-line prompt; comparable to the question calls, not to recommendations
+    record_backend_sample("gemini", "questions", time.perf_counter() - start, True)
+    return True
+
+# Response schemas for structured output (OpenAPI subset accepted by Gemini)
+QUESTIONS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "questions": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "id": {"type": "STRING"},
+                    "text": {"type": "STRING"},
+                    "options": {"type": "ARRAY", "items": {"type": "STRING"}}
+                },
+                "required": ["id", "text", "options"]
+            }
+        }
+    },
+    "required": ["questions"]
+}
+
+RECOMMENDATIONS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "recommendations": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "title": {"type": "STRING"},
+                    "year": {"type": "STRING", "nullable": True},
+                    "type": {"type": "STRING", "enum": ["movie", "show", "anime"]},
+                    "explanation": {"type": "STRING"}
+                },
+                "required": ["title", "type", "explanation"]
+            }
+        }
+    },
+    "required": ["recommendations"]
+}
+
+# Versioned prompt templates. v1 keeps the original free-form prompts so the
+# compact, schema-constrained v2 prompts can be compared against them.
+PROMPT_TEMPLATES = {
+    "persona_questions": {
+        "v1": {
+            "template": """
+            Generate {count} questions to understand a user's movie/anime watching preferences.
+            First question must ask if they prefer anime or movies.
+            Return the result as a JSON with this structure ONLY:
+            {{
+                "questions": [
+                    {{
+                        "id": "q1",
+                        "text": "Question text here",
+                        "options": ["Option 1", "Option 2", "Option 3"]
+                    }},
+                    {{
+                        "id": "q2",
+                        ...
+                    }}
+                ]
+            }}
+            The response must be valid JSON and nothing else.
+            """,
+            "schema": None,
+            "generation_config": DEFAULT_GENERATION_CONFIG
+        },
+        "v2": {
+            "template": (
+                "Write {count} multiple-choice questions about a viewer's movie/anime taste. "
+                "Question 1 asks whether they prefer anime or movies. "
+                "Ids q1-q{count}, 3-5 short options each."
+            ),
+            "schema": QUESTIONS_SCHEMA,
+            "generation_config": {"temperature": 0.7},
+            "output_tokens_per_item": 96
+        }
+    },
+    "mood_questions": {
+        "v1": {
+            "template": """
+            Based on this user persona: {persona_json}
+            
+            The user prefers {content_type} and enjoys {preferred_genres}.
+            
+            Generate {count} tailored questions to understand what kind of {content_type_lower} the user wants to watch right now.
+            Include questions about:
+            - Who they're watching with
+            - Their current mood
+            - Time available for watching
+            - Themes they're interested in
+
+            Return the result as a JSON with this structure ONLY:
+            {{
+                "questions": [
+                    {{
+                        "id": "q1",
+                        "text": "Question text here",
+                        "options": ["Option 1", "Option 2", "Option 3", "Option 4"]
+                    }},
+                    {{
+                        "id": "q2",
+                        ...
+                    }}
+                ]
+            }}
+            The response must be valid JSON and nothing else.
+            """,
+            "schema": None,
+            "generation_config": DEFAULT_GENERATION_CONFIG
+        },
+        "v2": {
+            "template": (
+                "Viewer profile: {persona_json}\n"
+                "Write {count} multiple-choice questions about what {content_type_lower} they want right now: "
+                "who they watch with, current mood, time available, theme. "
+                "Ids q1-q{count}, 4 short options each."
+            ),
+            "schema": QUESTIONS_SCHEMA,
+            "generation_config": {"temperature": 0.7},
+            "output_tokens_per_item": 96
+        }
+    },
+    "recommendations": {
+        # v1 (free-form JSON, no schema) was retired when v3 took over the pool
+        "v2": {
+            "template": (
+                "Viewer: {persona_json}\nRight now: {mood_json}\n"
+                "Recommend exactly {count} {kind}. Use exact titles. "
+                "explanation: one sentence, at most 25 words, tied to the viewer."
+            ),
+            "schema": RECOMMENDATIONS_SCHEMA,
+            # One short JSON object per recommendation
+            "generation_config": {"temperature": 0.7},
+            "output_tokens_per_item": 96
+        },
+        "v3": {
+            # Ranked pool, served page by page from the candidate cache
+            "template": (
+                "Viewer: {persona_json}\nRight now: {mood_json}\n"
+                "Rank {count} {kind} for this viewer, best match first, no repeats. Use exact titles. "
+                "explanation: one sentence, at most 20 words, tied to the viewer."
+            ),
+            "schema": RECOMMENDATIONS_SCHEMA,
+            "generation_config": {"temperature": 0.7},
+            "output_tokens_per_item": 64
+        }
+    }
+}
+
+# Share of sessions assigned to each prompt version
+PROMPT_EXPERIMENTS = {
+    "persona_questions": {"v2": 0.9, "v1": 0.1},
+    "mood_questions": {"v2": 0.9, "v1": 0.1},
+    "recommendations": {"v3": 0.9, "v2": 0.1}
+}
+
+# Pick (once per session) which version of a prompt this session uses
+def get_prompt_version(name):
+    versions = st.session_state.setdefault("prompt_versions", {})
+    if name not in versions:
+        weights = PROMPT_EXPERIMENTS[name]
+        versions[name] = random.choices(list(weights), weights=list(weights.values()))[0]
+    return versions[name]
+
+# Find JSON in a model response
+def parse_json_response(response_text):
+    json_start = response_text.find('{')
+    json_end = response_text.rfind('}') + 1
+    if json_start >= 0 and json_end > json_start:
+        return json.loads(response_text[json_start:json_end])
+    return None
+
+# Generic OpenAI-compatible chat completions endpoint, e.g. a local model server
+def openai_backend(request):
+    llm = get_config()["llm"]
+    if not llm["openai_base_url"]:
+        raise RuntimeError("No OpenAI-compatible endpoint configured")
+    headers = {'Content-Type': 'application/json'}
+    if openai_api_key:
+        headers["Authorization"] = f"Bearer {openai_api_key}"
+    messages = [{"role": "user", "content": request["prompt"]}]
+    data = {
+        "model": llm["openai_model"],
+        "messages": messages,
+        "temperature": request["generation_config"].get("temperature", 0.7),
+        "max_tokens": request["generation_config"].get("maxOutputTokens", 1024)
+    }
+    if request["response_schema"]:
+        # JSON mode; the schema goes in a system message since servers differ
+        # in how (and whether) they accept a JSON schema
+        messages.insert(0, {
+            "role": "system",
+            "content": "Reply with JSON only, matching this schema: " + json.dumps(request["response_schema"], separators=(",", ":"))
+        })
+        data["response_format"] = {"type": "json_object"}
+    
+    response = get_http_session().post(
+        f"{llm['openai_base_url'].rstrip('/')}/chat/completions",
+        headers=headers, json=data, timeout=get_timeout()
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"OpenAI-compatible API error: {response.status_code} - {response.text}")
+    
+    response_data = response.json()
+    try:
+        text = response_data["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        raise RuntimeError("Unexpected response format from OpenAI-compatible API")
+    usage = response_data.get("usage") or {}
+    return text, {
+        "input_tokens": usage.get("prompt_tokens", 0),
+        "output_tokens": usage.get("completion_tokens", 0)
+    }
 
-gemini_available = initialize_gemini()
+# Deterministic offline backend: answers from built-in questions and a small
+# catalog, ranked against the answers. Never fails and makes no upstream calls.
+def template_backend(request):
+    name = request["name"]
+    fields = request["fields"]
+    count = fields.get("count", 3)
+    if name == "persona_questions":
+        return json.dumps({"questions": FALLBACK_PERSONA_QUESTIONS[:count]}), {}
+    if name == "mood_questions":
+        return json.dumps({"questions": FALLBACK_MOOD_QUESTIONS[:count]}), {}
+    if name == "recommendations":
+        return json.dumps({"recommendations": rank_offline_catalog(fields, count)}), {}
+    raise RuntimeError(f"The template backend has no answer for '{name}'")
+
+def rank_offline_catalog(fields, count):
+    answers = f"{fields.get('persona_json', '')} {fields.get('mood_json', '')}".lower()
+    wants_anime = "anime" in fields.get("kind", "")
+    
+    def score(entry):
+        matches = sum(1 for tag in entry["tags"] if tag in answers)
+        type_match = (entry["type"] == "anime") == wants_anime
+        return (type_match, matches)
+    
+    # sorted() is stable, so equal scores keep catalog order
+    ranked = sorted(OFFLINE_CATALOG, key=score, reverse=True)
+    return [
+        {key: entry[key] for key in ("title", "year", "type", "explanation")}
+        for entry in ranked[:count]
+    ]
+
+LLM_BACKENDS = {
+    "gemini": gemini_backend,
+    "openai": openai_backend,
+    "template": template_backend
+}
+
+# Rolling latency/error samples per (backend, route), shared by every
+# session. Question and recommendation calls differ a lot in size, so each
+# route judges a backend on its own calls.
+@st.cache_resource(show_spinner=False)
+def llm_router_state():
+    return {"lock": threading.Lock(), "samples": {}, "probed_at": {}, "probing": set()}
+
+def prompt_route(name):
+    return "questions" if name.endswith("_questions") else "recommendations"
+
+def record_backend_sample(backend, route, latency_seconds, ok):
+    llm = get_config()["llm"]
+    state = llm_router_state()
+    with state["lock"]:
+        samples = state["samples"].get((backend, route))
+        if samples is None or samples.maxlen != llm["window"]:
+            samples = deque(samples or [], maxlen=llm["window"])
+            state["samples"][(backend, route)] = samples
+        if (backend, route) in state["probing"]:
+            state["probing"].discard((backend, route))
+            # A probe that came back healthy restores the backend outright
+            if ok and latency_seconds * 1000 <= llm["latency_budget_ms"]:
+                samples.clear()
+                state["probed_at"].pop((backend, route), None)
+        samples.append((time.time(), latency_seconds * 1000, ok))
+
+# Whether the backend has answered a call successfully since `since`
+def backend_answered_since(backend, since):
+    state = llm_router_state()
+    with state["lock"]:
+        return any(
+            ok and at >= since
+            for (name, _), samples in state["samples"].items() if name == backend
+            for at, _, ok in samples
+        )
+
+def backend_health(backend, route):
+    oldest = time.time() - get_config()["llm"]["sample_max_age_seconds"]
+    state = llm_router_state()
+    with state["lock"]:
+        samples = [(latency, ok) for at, latency, ok in state["samples"].get((backend, route), []) if at >= oldest]
+    if not samples:
+        return {"samples": 0, "p95_ms": None, "error_rate": 0.0}
+    latencies = sorted(latency for latency, _ in samples)
+    return {
+        "samples": len(samples),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+        "error_rate": round(sum(1 for _, ok in samples if not ok) / len(samples), 2)
+    }
+
+# Backends to try for a prompt, in order. The configured route order is kept
+# for healthy backends; ones over the p95 latency budget or error-rate limit
+# (once they have enough recent samples) are moved to the end, fastest first.
+# A demoted backend is tried first again once every probe_seconds, so it can
+# earn its place back; the template backend never fails, so without probes a
+# demoted backend would never get new samples.
+def route_llm(name):
+    llm = get_config()["llm"]
+    route_name = prompt_route(name)
+    route = llm["question_route"] if route_name == "questions" else llm["recommendation_route"]
+    healthy, degraded, probes = [], [], []
+    state = llm_router_state()
+    for backend in route:
+        if backend == "gemini" and not gemini_api_key or backend == "openai" and not llm["openai_base_url"]:
+            continue
+        health = backend_health(backend, route_name)
+        if health["samples"] >= llm["min_samples"] and (
+                health["error_rate"] > llm["max_error_rate"] or health["p95_ms"] > llm["latency_budget_ms"]):
+            with state["lock"]:
+                # The cooldown starts when the backend is first seen degraded
+                due = time.time() - state["probed_at"].setdefault((backend, route_name), time.time()) >= llm["probe_seconds"]
+                if due:
+                    state["probed_at"][(backend, route_name)] = time.time()
+                    state["probing"].add((backend, route_name))
+            if due:
+                probes.append(backend)
+            else:
+                degraded.append((health["p95_ms"], backend))
+        else:
+            healthy.append(backend)
+    return probes + healthy + [backend for _, backend in sorted(degraded)]
+
+# Render a versioned prompt and send it along the routed backends until one
+# returns parseable JSON. Parse failures count as backend failures, both in
+# the router and in the per-version quality stats. With return_backend=True
+# the answering backend's name is returned alongside the parsed JSON.
+def run_prompt(name, return_backend=False, **fields):
+    version = get_prompt_version(name)
+    spec = PROMPT_TEMPLATES[name][version]
+    generation_config = dict(spec["generation_config"])
+    if "output_tokens_per_item" in spec:
+        # Size the output budget to the number of items asked for
+        generation_config["maxOutputTokens"] = 64 + spec["output_tokens_per_item"] * fields["count"]
+    request = {
+        "prompt": spec["template"].format(**fields),
+        "generation_config": generation_config,
+        "response_schema": spec["schema"],
+        "name": name,
+        "fields": fields
+    }
+    
+    errors = []
+    for backend in route_llm(name):
+        call_type = f"{name}:{version}@{backend}"
+        start = time.perf_counter()
+        usage = {}
+        try:
+            response_text, usage = LLM_BACKENDS[backend](request)
+            parsed = parse_json_response(response_text)
+            if not parsed:
+                raise RuntimeError("No JSON in response")
+        except Exception as e:
+            latency = time.perf_counter() - start
+            record_backend_sample(backend, prompt_route(name), latency, False)
+            record_llm_call(call_type, latency, usage, False)
+            errors.append(f"{backend}: {str(e)}")
+            continue
+        latency = time.perf_counter() - start
+        record_backend_sample(backend, prompt_route(name), latency, True)
+        record_llm_call(call_type, latency, usage, True)
+        return (parsed, backend) if return_backend else parsed
+    
+    st.error("All model backends failed: " + "; ".join(errors))
+    return (None, None) if return_backend else None
 
 # Custom CSS for dark UI with neon purple outlines
 def load_css():
@@ -247,50 +1052,168 @@ def load_css():
 
 load_css()
 
+# Record bytes downloaded and JSON parse time for the current session
+def record_transfer(kind, wire_bytes, decoded_bytes, parse_seconds):
+    stats = session_stats("transfer_stats")
+    if stats is None:
+        return
+    with stats_lock():
+        entry = stats.setdefault(kind, {"requests": 0, "wire_bytes": 0, "bytes": 0, "parse_ms": 0.0})
+        entry["requests"] += 1
+        entry["wire_bytes"] += wire_bytes
+        entry["bytes"] += decoded_bytes
+        entry["parse_ms"] += parse_seconds * 1000
+
+# Bytes actually transferred: TMDB gzips its responses and response.content
+# is the decompressed body
+def wire_size(response):
+    length = response.headers.get("Content-Length", "")
+    if length.isdigit():
+        return int(length)
+    try:
+        # urllib3 counts the raw (still compressed) bytes it has read
+        return response.raw.tell()
+    except AttributeError:
+        return len(response.content)
+
+# Shared GET helper for TMDB endpoints
+def tmdb_get(path, params=None, kind="other"):
+    """Return (response, parsed JSON or None) and record the transfer under `kind`"""
+    url = f"{get_config()['api']['tmdb_base_url']}{path}"
+    headers = {
+        "accept": "application/json",
+        "Authorization": f"Bearer {tmdb_api_key}"
+    }
+    response = get_http_session().get(url, headers=headers, params=params, timeout=get_timeout())
+    data = None
+    parse_seconds = 0.0
+    if response.status_code == 200:
+        start = time.perf_counter()
+        data = response.json()
+        parse_seconds = time.perf_counter() - start
+    record_transfer(kind, wire_size(response), len(response.content), parse_seconds)
+    return response, data
+
+# Fetch the TMDB configuration once per process; failures are not cached
+@st.cache_data(ttl=24 * 60 * 60, show_spinner=False)
+def fetch_tmdb_config():
+    response, data = tmdb_get("/configuration", kind="configuration")
+    if data is None:
+        raise RuntimeError(f"Failed to get TMDB configuration: {response.status_code}")
+    return data
+
 # Get TMDB configuration
 def get_tmdb_config():
     if not tmdb_api_key or tmdb_api_key == "YOUR_TMDB_API_KEY_HERE":
         st.error("TMDB API key not properly configured")
         return None
-        
-    url = "https://api.themoviedb.org/3/configuration"
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {tmdb_api_key}"
-    }
     
     try:
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"Failed to get TMDB configuration: {response.status_code}")
-            return None
+        return fetch_tmdb_config()
+    except RuntimeError as e:
+        st.error(str(e))
+        return None
     except Exception as e:
         st.error(f"Error connecting to TMDB API: {str(e)}")
         return None
 
+# Preflight warmup, run once per server process before the first session is
+# served: opens the pooled connections, primes the TMDB configuration cache and
+# checks Gemini. The two upstream checks run concurrently. Neither is repeated
+# here: a failed TMDB fetch is retried per session (failures are not cached)
+# and the router keeps trying a failed Gemini on real calls.
+@st.cache_resource(show_spinner=False)
+def warmup():
+    from concurrent.futures import ThreadPoolExecutor
+    
+    timings = {}
+    
+    def timed(name, fn):
+        start = time.perf_counter()
+        result = fn()
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+    
+    get_http_session()
+    # Starts the background refresher for the quick picks pool
+    quick_picks_pool()
+    checked_at = time.time()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        tmdb_config = pool.submit(timed, "tmdb_config", get_tmdb_config)
+        gemini_check = pool.submit(timed, "gemini_healthcheck", initialize_gemini)
+        services = {
+            "tmdb_config": tmdb_config.result(),
+            "gemini_available": gemini_check.result()
+        }
+    services["timings_ms"] = timings
+    services["checked_at"] = checked_at
+    return services
+
+# Import-time profile of this script's module-level imports, from
+# `python -X importtime`; the list comes from the same parser the startup
+# benchmark uses, so the two always agree
+@st.cache_data(show_spinner=False)
+def import_time_summary(top=10):
+    import subprocess
+    import sys
+    from bench_startup import startup_imports
+    
+    modules = startup_imports(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modules}"],
+        capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        # Lines look like: "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        rows.append({
+            "module": name.strip(),
+            "top_level": name.startswith(" ") and not name.startswith("  "),
+            "self ms": int(self_us) / 1000,
+            "cumulative ms": int(cumulative_us) / 1000
+        })
+    top_level = [row for row in rows if row.pop("top_level")]
+    return {
+        "modules": modules,
+        "total_ms": round(sum(row["cumulative ms"] for row in top_level), 1),
+        "slowest": sorted(rows, key=lambda row: row["cumulative ms"], reverse=True)[:top]
+    }
+
 # Modified search_movies function with better anime handling
-def search_movies(query, media_type="movie"):
+def search_movies(query, media_type="movie", content_type=""):
     if not tmdb_api_key:
         return None
     
+    config = get_config()
+    debug = config["design"]["debug_mode"]
+    
     # Clean the query - remove special characters that might affect search
     cleaned_query = query.replace('!', '').replace(':', ' ').strip()
     
+    # Exact title matches in the shared snapshot need no upstream call
+    catalog = get_catalog()
+    if catalog:
+        matches = catalog.search(cleaned_query, media_type)
+        if matches:
+            if debug:
+                st.write(f"Found {len(matches)} results in the catalog snapshot")
+            return {"results": matches}
+    
     # Special handling for anime titles
-    if media_type == "tv" and ("anime" in st.session_state.persona.get("content_type", "").lower() or 
-                              any(word in cleaned_query.lower() for word in ["k-on", "nichijou", "aggretsuko"])):
+    if (config["anime"]["special_handling"] and config["anime"]["add_anime_keyword"] and media_type == "tv" and
+            ("anime" in content_type.lower() or 
+             any(word in cleaned_query.lower() for word in ["k-on", "nichijou", "aggretsuko"]))):
         # Add "anime" to search query for better results
         cleaned_query = f"{cleaned_query} anime"
     
-    st.write(f"Searching for: {cleaned_query} as {media_type}")  # Debug
+    if debug:
+        st.write(f"Searching for: {cleaned_query} as {media_type}")
     
-    url = f"https://api.themoviedb.org/3/search/{media_type}"
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {tmdb_api_key}"
-    }
     params = {
         "query": cleaned_query,
         "include_adult": "false",
@@ -299,44 +1222,145 @@ def search_movies(query, media_type="movie"):
     }
     
     try:
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            result = response.json()
-            # Debug output
-            st.write(f"Found {len(result.get('results', []))} results")
+        response, result = tmdb_get(f"/search/{media_type}", params=params, kind="search")
+        if result is not None:
+            if debug:
+                st.write(f"Found {len(result.get('results', []))} results")
             if not result.get('results'):
                 # Try alternative search approach for anime
-                if media_type == "tv":
+                if media_type == "tv" and config["recommendations"]["search_expansions"]:
                     # Try searching as movie as fallback
-                    st.write(f"Retrying as movie search")
-                    return search_movies(query, "movie")
+                    if debug:
+                        st.write(f"Retrying as movie search")
+                    time.sleep(config["api"]["fallback_delay"] / 1000)
+                    return search_movies(query, "movie", content_type)
             return result
         else:
             st.error(f"Failed to search movies: {response.status_code}")
-            st.write(f"Response: {response.text}")  # Debug
+            if debug:
+                st.write(f"Response: {response.text}")
             return None
     except Exception as e:
         st.error(f"Error searching movies: {str(e)}")
         return None
 
+# Shared read-only catalog snapshot (see catalog_snapshot.py). Every worker
+# process maps the same file; a newer snapshot swapped in at the same path
+# is picked up within a second.
+@st.cache_resource(show_spinner=False)
+def catalog_state():
+    return {"lock": threading.Lock(), "snapshot": None, "checked_at": 0.0}
+
+def get_catalog():
+    path = get_config()["catalog"]["snapshot_path"]
+    if not path:
+        return None
+    state = catalog_state()
+    with state["lock"]:
+        snapshot = state["snapshot"]
+        if snapshot and snapshot.path == path and time.time() - state["checked_at"] < 1:
+            return snapshot
+        state["checked_at"] = time.time()
+        if snapshot is None or snapshot.path != path or snapshot.is_stale():
+            from catalog_snapshot import CatalogSnapshot
+            try:
+                state["snapshot"] = CatalogSnapshot(path)
+            except (OSError, ValueError):
+                state["snapshot"] = None
+        return state["snapshot"]
+
+# Fields the recommendation cards actually render; everything else is dropped
+CARD_FIELDS = ("id", "title", "name", "release_date", "first_air_date", "overview", "poster_path", "genres")
+
+def project_card(details):
+    return {field: details[field] for field in CARD_FIELDS if field in details}
+
+# Slim card payload, fetched eagerly for every recommendation
 def get_movie_details(movie_id, media_type="movie"):
     if not tmdb_api_key:
         return None
-        
-    url = f"https://api.themoviedb.org/3/{media_type}/{movie_id}"
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {tmdb_api_key}"
+    
+    catalog = get_catalog()
+    if catalog:
+        card = catalog.get(media_type, movie_id)
+        if card:
+            return project_card(card)
+    
+    cache_key = (media_type, movie_id)
+    cached = cache_get("card_cache", cache_key)
+    if cached is not None:
+        return cached
+    
+    params = {
+        "language": "en-US"
+    }
+    
+    try:
+        response, details = tmdb_get(f"/{media_type}/{movie_id}", params=params, kind="card")
+        if details is not None:
+            card = project_card(details)
+            cache_put("card_cache", cache_key, card)
+            return card
+        else:
+            st.error(f"Failed to get movie details: {response.status_code}")
+            return None
+    except Exception as e:
+        st.error(f"Error getting movie details: {str(e)}")
+        return None
+
+# Heavy sections are fetched lazily, only when a card is expanded.
+# Each projector keeps just what the expanded card shows.
+def project_credits(credits):
+    return {
+        "cast": [person["name"] for person in credits.get("cast", [])[:5]],
+        "directors": [person["name"] for person in credits.get("crew", []) if person.get("job") == "Director"]
     }
+
+def project_videos(videos):
+    for video in videos.get("results", []):
+        if video.get("site") == "YouTube" and video.get("type") == "Trailer":
+            return {"trailer_key": video.get("key")}
+    return {"trailer_key": None}
+
+def project_similar(similar):
+    return {
+        "titles": [item.get("title", item.get("name", "")) for item in similar.get("results", [])[:5]]
+    }
+
+def project_watch_providers(providers, region="US"):
+    flatrate = providers.get("results", {}).get(region, {}).get("flatrate", [])
+    return {"providers": [provider["provider_name"] for provider in flatrate]}
+
+DETAIL_SECTIONS = {
+    "credits": project_credits,
+    "videos": project_videos,
+    "similar": project_similar,
+    "watch/providers": project_watch_providers
+}
+
+def get_movie_sections(movie_id, media_type="movie"):
+    if not tmdb_api_key:
+        return None
+    
+    cache_key = (media_type, movie_id)
+    cached = cache_get("section_cache", cache_key)
+    if cached is not None:
+        return cached
+    
     params = {
         "language": "en-US",
-        "append_to_response": "credits,videos"
+        "append_to_response": ",".join(DETAIL_SECTIONS)
     }
     
     try:
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            return response.json()
+        response, details = tmdb_get(f"/{media_type}/{movie_id}", params=params, kind="sections")
+        if details is not None:
+            sections = {
+                name: project(details.get(name, {}))
+                for name, project in DETAIL_SECTIONS.items()
+            }
+            cache_put("section_cache", cache_key, sections)
+            return sections
         else:
             st.error(f"Failed to get movie details: {response.status_code}")
             return None
@@ -344,17 +1368,789 @@ def get_movie_details(movie_id, media_type="movie"):
         st.error(f"Error getting movie details: {str(e)}")
         return None
 
+# Poster size from config.toml, or the medium size if TMDB doesn't offer it
+def get_poster_size(tmdb_config):
+    sizes = tmdb_config["images"]["poster_sizes"]
+    wanted = get_config()["recommendations"]["poster_size"]
+    if wanted in sizes:
+        return wanted
+    return sizes[min(3, len(sizes) - 1)]
+
 # Function to get image URL with fallback
 def get_image_url(poster_path, base_url, poster_size):
     if poster_path:
         return f"{base_url}{poster_size}{poster_path}"
     return "https://i.ibb.co/s9ZYS5wk/45e6544ed099.jpg"  # Use provided fallback image
 
+# Render the lazily fetched sections of an expanded card
+def render_card_sections(rec):
+    sections = get_movie_sections(rec["id"], rec["media_type"])
+    if not sections:
+        st.write("More details are not available right now.")
+        return
+    
+    credits = sections["credits"]
+    if credits["directors"]:
+        st.markdown(f"**Director:** {', '.join(credits['directors'])}")
+    if credits["cast"]:
+        st.markdown(f"**Cast:** {', '.join(credits['cast'])}")
+    if sections["watch/providers"]["providers"]:
+        st.markdown(f"**Streaming on:** {', '.join(sections['watch/providers']['providers'])}")
+    if sections["similar"]["titles"]:
+        st.markdown(f"**Similar:** {', '.join(sections['similar']['titles'])}")
+    if sections["videos"]["trailer_key"]:
+        st.video(f"https://www.youtube.com/watch?v={sections['videos']['trailer_key']}")
+
+# Per-session network and LLM diagnostics
+def render_diagnostics():
+    stats = stats_snapshot("transfer_stats")
+    llm_stats = stats_snapshot("llm_stats")
+    with st.expander("Diagnostics"):
+        if not stats and not llm_stats:
+            st.write("No upstream requests recorded in this session.")
+        if stats:
+            st.table([
+                {
+                    "kind": kind,
+                    "requests": entry["requests"],
+                    "KB transferred": round(entry["wire_bytes"] / 1024, 1),
+                    "KB decompressed": round(entry["bytes"] / 1024, 1),
+                    "JSON parse ms": round(entry["parse_ms"], 2)
+                }
+                for kind, entry in stats.items()
+            ])
+        if llm_stats:
+            st.table([
+                {
+                    "call type": call_type,
+                    "calls": entry["calls"],
+                    "failures": entry["failures"],
+                    "avg latency ms": round(entry["latency_ms"] / entry["calls"], 1),
+                    "input tokens": entry["input_tokens"],
+                    "output tokens": entry["output_tokens"]
+                }
+                for call_type, entry in llm_stats.items()
+            ])
+        
+        st.markdown("**Admission (this process)**")
+        st.table([admission_metrics()])
+        
+        st.markdown("**Model backends**")
+        st.table([
+            {"backend": backend, "route": route, **backend_health(backend, route)}
+            for backend in LLM_BACKENDS
+            for route in ("questions", "recommendations")
+        ])
+        
+        catalog = get_catalog()
+        if catalog:
+            st.markdown("**Catalog snapshot**")
+            st.write({"path": catalog.path, "rows": catalog.rows})
+        
+        pool = quick_picks_pool()
+        st.markdown("**Quick picks**")
+        st.write({
+            "titles": pool["items"],
+            "segments": len(pool["segments"]),
+            "age s": round(time.time() - pool["refreshed_at"]) if pool["refreshed_at"] else None,
+            "last error": pool["last_error"]
+        })
+        
+        st.markdown("**Startup**")
+        st.write({"warmup ms": warmup()["timings_ms"]})
+        # Spawns a profiling interpreter, so only on request
+        if st.session_state.get("show_import_profile") or st.button("Profile startup imports"):
+            st.session_state.show_import_profile = True
+            imports = import_time_summary()
+            st.write(f"Import time for `{imports['modules']}`: {imports['total_ms']} ms")
+            st.table(imports["slowest"])
+
+# Everything enrichment needs from the session, captured on the script thread
+def card_context():
+    tmdb_config = st.session_state.tmdb_config
+    return {
+        "base_url": tmdb_config["images"]["secure_base_url"],
+        "poster_size": get_poster_size(tmdb_config),
+        "content_type": st.session_state.persona.get("content_type", "")
+    }
+
+# Card for a recommendation from TMDB details (or a search result, which
+# has no genres), or a basic card with the fallback image when `details` is None
+def build_card(rec, details, media_type, context):
+    if details is None:
+        return {
+            "id": 0,
+            "title": rec["title"],
+            "year": rec.get("year", ""),
+            "overview": "Details not available from our database, but this is a great match for your preferences!",
+            "image_url": get_image_url(None, context["base_url"], context["poster_size"]),
+            "explanation": rec["explanation"],
+            "media_type": rec["type"].lower(),
+            "genres": ["N/A"]
+        }
+    return {
+        "id": details["id"],
+        "title": details.get("title", details.get("name", rec["title"])),
+        "year": details.get("release_date", details.get("first_air_date", rec.get("year", ""))),
+        "overview": details.get("overview", "Details not available."),
+        "image_url": get_image_url(details.get("poster_path"), context["base_url"], context["poster_size"]),
+        "explanation": rec["explanation"],
+        "media_type": media_type,
+        "genres": [genre["name"] for genre in details.get("genres", [])] or ["N/A"]
+    }
+
+# Look up a recommendation on TMDB and build its card. Runs on worker
+# threads, so it only reads the captured context.
+def enrich_recommendation(rec, context):
+    # Determine media type for API
+    media_type = "movie"
+    if rec["type"].lower() in ["show", "tv show", "tv", "series"]:
+        media_type = "tv"
+    elif rec["type"].lower() == "anime":
+        media_type = "tv"  # Most anime are categorized as TV shows in TMDB
+    
+    # Search for the title with enhanced handling for anime
+    search_results = search_movies(rec["title"], media_type, context["content_type"])
+    
+    if search_results and search_results.get("results", []):
+        # Get the first result
+        result = search_results["results"][0]
+        
+        # Get detailed information, or make do with the search result data
+        details = get_movie_details(result["id"], media_type)
+        return build_card(rec, details or result, media_type, context)
+    else:
+        # If TMDB search fails, create a basic recommendation with fallback image
+        return build_card(rec, None, media_type, context)
+
+# Hand this session's stats dicts to worker threads
+def with_session_stats(fn):
+    stats = {name: session_stats(name) for name in ("transfer_stats", "llm_stats")}
+    
+    def run(*args):
+        for name, value in stats.items():
+            setattr(worker_state, name, value)
+        return fn(*args)
+    
+    return run
+
+# Enrich a page of candidates with bounded concurrency
+def enrich_page(recs, context):
+    from concurrent.futures import ThreadPoolExecutor
+    
+    workers = get_config()["performance"]["max_concurrent_requests"]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(with_session_stats(enrich_recommendation), recs, [context] * len(recs)))
+
+# Ranked candidate pools, keyed by prompt version and answers, shared by all sessions
+@st.cache_resource(show_spinner=False)
+def candidate_pool_store():
+    return {"lock": threading.Lock(), "pools": {}}
+
+# Pools are keyed by prompt version too, so each arm of the prompt experiment
+# is only ever served its own pools
+def candidate_pool_key(persona_json, mood_json):
+    pool_size = get_config()["recommendations"]["candidate_pool_size"]
+    return (get_prompt_version("recommendations"), persona_json, mood_json, pool_size)
+
+# A fresh cached pool for these answers, without generating one
+def peek_candidate_pool(persona_json, mood_json):
+    config = get_config()
+    key = candidate_pool_key(persona_json, mood_json)
+    store = candidate_pool_store()
+    with store["lock"]:
+        entry = store["pools"].get(key)
+    if entry and time.time() - entry[0] <= config["performance"]["cache_ttl_seconds"]:
+        return entry[1]
+    return None
+
+def get_candidate_pool(persona_json, mood_json, is_anime_fan):
+    cached = peek_candidate_pool(persona_json, mood_json)
+    if cached:
+        return cached
+    
+    config = get_config()
+    pool_size = config["recommendations"]["candidate_pool_size"]
+    key = candidate_pool_key(persona_json, mood_json)
+    store = candidate_pool_store()
+    persona = json.loads(persona_json)
+    mood_context = json.loads(mood_json)
+    # run_prompt reports backend failures itself; anything else is a bug
+    parsed, backend = run_prompt(
+        "recommendations",
+        return_backend=True,
+        count=pool_size,
+        persona_json=persona_json,
+        mood_json=mood_json,
+        content_type=persona.get("content_type", ""),
+        preferred_genres=persona.get("preferred_genres", ""),
+        mood=mood_context.get("current_mood", ""),
+        kind='anime series or movies' if is_anime_fan else 'movies or shows'
+    )
+    if not parsed or not parsed.get("recommendations"):
+        return None
+    # Offline answers are cheap to recompute; don't let them shadow a model
+    # answer once the remote backends recover
+    if backend == "template":
+        return parsed["recommendations"]
+    
+    with store["lock"]:
+        pools = store["pools"]
+        pools.pop(key, None)
+        pools[key] = (time.time(), parsed["recommendations"])
+        while len(pools) > config["performance"]["cache_max_entries"]:
+            del pools[next(iter(pools))]
+    return parsed["recommendations"]
+
+# Admission control for the searching stage. At most max_concurrent sessions
+# per process (and, with host_slots_dir set, per host) run the upstream
+# LLM/TMDB work at once; others wait in a bounded FIFO queue and are shed to
+# local recommendations when it is full or they have waited too long.
+@st.cache_resource(show_spinner=False)
+def admission_state():
+    return {
+        "cond": threading.Condition(),
+        "active": 0,
+        "queue": deque(),
+        "admitted": 0,
+        "shed": 0,
+        "waits_ms": deque(maxlen=500)
+    }
+
+# Host-wide slots are lock files; the OS drops a lock if its process dies
+def try_host_slot(settings):
+    import fcntl
+    
+    os.makedirs(settings["host_slots_dir"], exist_ok=True)
+    for slot in range(settings["host_max_concurrent"]):
+        fd = os.open(os.path.join(settings["host_slots_dir"], f"slot-{slot}.lock"), os.O_RDWR | os.O_CREAT)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            os.close(fd)
+    return None
+
+# Take a free slot if there is one; called with state["cond"] held
+def take_slot(state, settings, waited_since):
+    if state["active"] >= settings["max_concurrent"]:
+        return None
+    host_slot = try_host_slot(settings) if settings["host_slots_dir"] else None
+    if settings["host_slots_dir"] and host_slot is None:
+        return None
+    state["active"] += 1
+    state["admitted"] += 1
+    state["waits_ms"].append((time.perf_counter() - waited_since) * 1000)
+    return {"host_slot": host_slot, "state": state}
+
+# Wait for a slot, calling on_wait(position) while queued. Returns a release
+# token when admitted, or None when the request is shed. max_queue only
+# counts sessions that actually have to wait.
+def admit_search(on_wait):
+    settings = get_config()["admission"]
+    state = admission_state()
+    ticket = object()
+    start = time.perf_counter()
+    with state["cond"]:
+        token = None if state["queue"] else take_slot(state, settings, start)
+        if token:
+            return token
+        if len(state["queue"]) >= settings["max_queue"]:
+            state["shed"] += 1
+            return None
+        state["queue"].append(ticket)
+    try:
+        while True:
+            with state["cond"]:
+                token = take_slot(state, settings, start) if state["queue"][0] is ticket else None
+                if token:
+                    state["queue"].popleft()
+                    # Let the next in line check for another free slot
+                    state["cond"].notify_all()
+                    return token
+                if time.perf_counter() - start > settings["max_wait_seconds"]:
+                    state["queue"].remove(ticket)
+                    state["shed"] += 1
+                    state["cond"].notify_all()
+                    return None
+                position = state["queue"].index(ticket) + 1
+            on_wait(position)
+            with state["cond"]:
+                state["cond"].wait(0.5)
+    except BaseException:
+        # The session went away (e.g. a rerun) while queued
+        with state["cond"]:
+            if ticket in state["queue"]:
+                state["queue"].remove(ticket)
+            state["cond"].notify_all()
+        raise
+
+# May run on a prefetch thread, so it only uses the state held by the token
+def release_search(token):
+    state = token["state"]
+    if token["host_slot"] is not None:
+        os.close(token["host_slot"])  # closing the file drops its lock
+    with state["cond"]:
+        state["active"] -= 1
+        state["cond"].notify_all()
+
+# Whether sessions are queued for a slot in this process
+def admission_waiting():
+    state = admission_state()
+    with state["cond"]:
+        return bool(state["queue"])
+
+def admission_metrics():
+    state = admission_state()
+    with state["cond"]:
+        waits = sorted(state["waits_ms"])
+        return {
+            "active": state["active"],
+            "queue length": len(state["queue"]),
+            "admitted": state["admitted"],
+            "shed": state["shed"],
+            "avg wait ms": round(sum(waits) / len(waits), 1) if waits else 0.0,
+            "p95 wait ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 1) if waits else 0.0
+        }
+
+# Recommendations for a shed request: a cached pool for the same answers or
+# the offline template ranking, with cards from the catalog snapshot when
+# available. Makes no upstream calls.
+def shed_recommendations(persona_json, mood_json, is_anime_fan):
+    page_size = get_config()["recommendations"]["max_recommendations"]
+    recs = peek_candidate_pool(persona_json, mood_json) or rank_offline_catalog(
+        {
+            "persona_json": persona_json,
+            "mood_json": mood_json,
+            "kind": 'anime series or movies' if is_anime_fan else 'movies or shows'
+        },
+        get_config()["recommendations"]["candidate_pool_size"]
+    )
+    if 'profile' in st.session_state:
+        recs = personalize_pool(recs, st.session_state.profile)
+    context = card_context()
+    catalog = get_catalog()
+    cards = []
+    for rec in recs[:page_size]:
+        matches = catalog.search(rec["title"]) if catalog else []
+        details = matches[0] if matches else None
+        cards.append(build_card(rec, details, details["media_type"] if details else None, context))
+    remember_shown(cards, recs[:page_size])
+    return cards
+
+# Start enriching the page at `start` in the background. A prefetch started
+# inside the searching stage holds that session's admission slot until it
+# finishes, so its TMDB calls count against the limit; other prefetches are
+# skipped while sessions are waiting for a slot.
+def start_prefetch(start, admission=None):
+    page_size = get_config()["recommendations"]["max_recommendations"]
+    recs = st.session_state.candidate_pool[start:start + page_size]
+    if not recs or admission is None and get_config()["admission"]["enabled"] and admission_waiting():
+        if admission:
+            release_search(admission)
+        return
+    
+    job = {"start": start, "size": len(recs), "results": None, "done": threading.Event()}
+    context = card_context()
+    
+    def run():
+        try:
+            job["results"] = enrich_page(recs, context)
+        finally:
+            job["done"].set()
+            if admission:
+                release_search(admission)
+    
+    # Plain thread with no script context: it outlives this script run
+    threading.Thread(target=with_session_stats(run), daemon=True).start()
+    st.session_state.prefetch = job
+
+# Append the next page of the pool to the shown recommendations and
+# prefetch the page after it; `admission` is handed on to the prefetch
+def load_next_page(admission=None):
+    page_size = get_config()["recommendations"]["max_recommendations"]
+    start = st.session_state.pool_cursor
+    job = st.session_state.get("prefetch")
+    if job and job["start"] == start and job["size"] == min(page_size, len(st.session_state.candidate_pool) - start):
+        job["done"].wait()
+        page = job["results"]
+    else:
+        page = None
+    if page is None:
+        page = enrich_page(st.session_state.candidate_pool[start:start + page_size], card_context())
+    
+    # The model sometimes names the same title twice; show each TMDB entry once
+    shown = {(rec["media_type"], rec["id"]) for rec in st.session_state.recommendations if rec["id"]}
+    recs = st.session_state.recommendations
+    # Cards remember their page so a page that lost a duplicate keeps its own row
+    page_number = recs[-1].get("page", 0) + 1 if recs else 0
+    unique = []
+    for rec in page:
+        if rec["id"] and (rec["media_type"], rec["id"]) in shown:
+            continue
+        shown.add((rec["media_type"], rec["id"]))
+        unique.append({**rec, "page": page_number})
+    page = unique
+    st.session_state.recommendations += page
+    remember_shown(page, st.session_state.candidate_pool[start:start + page_size])
+    st.session_state.pool_cursor = start + page_size
+    start_prefetch(st.session_state.pool_cursor, admission)
+
+# Quick picks: a background-refreshed pool of trending/popular titles,
+# segmented by the persona answers so it can be served with no upstream calls
+
+# Lists pulled on every refresh: (content bucket, media type, TMDB path, params, label)
+QUICK_PICK_SOURCES = [
+    ("movies", "movie", "/trending/movie/week", {}, "Trending this week"),
+    ("movies", "movie", "/movie/popular", {}, "Popular on TMDB"),
+    ("movies", "tv", "/trending/tv/week", {}, "Trending this week"),
+    ("movies", "tv", "/tv/popular", {}, "Popular on TMDB"),
+    ("anime", "tv", "/discover/tv", {"with_genres": "16", "sort_by": "popularity.desc"}, "Popular animation"),
+    ("anime", "movie", "/discover/movie", {"with_genres": "16", "sort_by": "popularity.desc"}, "Popular animation")
+]
+
+ANIMATION_GENRE_ID = 16
+
+# Persona answer keywords -> segment values
+LANGUAGE_SEGMENTS = {
+    "en": ("english",),
+    "ja": ("japanese",),
+    "ko": ("korean",),
+    "hi": ("bollywood", "hindi")
+}
+
+GENRE_SEGMENTS = {
+    "action": (("action", "adventure"), {28, 12, 10759}),
+    "drama": (("drama", "romance"), {18, 10749}),
+    "comedy": (("comedy",), {35}),
+    "scifi": (("sci-fi", "fantasy", "science"), {878, 14, 10765})
+}
+
+# Map persona answers onto (content, language, genre); "any" where unknown
+def persona_segment(answers):
+    content, language, genre = "any", "any", "any"
+    for value in answers.values():
+        value = str(value).lower()
+        if content == "any" and "both" not in value:
+            if "anime" in value:
+                content = "anime"
+            elif "movie" in value:
+                content = "movies"
+        if language == "any":
+            language = next((code for code, words in LANGUAGE_SEGMENTS.items() if any(word in value for word in words)), "any")
+        if genre == "any":
+            genre = next((name for name, (words, _) in GENRE_SEGMENTS.items() if any(word in value for word in words)), "any")
+    return content, language, genre
+
+# Pull the source lists and build every segment
+def refresh_quick_picks(state):
+    settings = get_config()["quick_picks"]
+    try:
+        tmdb_config = fetch_tmdb_config()
+    except (RuntimeError, requests.RequestException):
+        # Image URLs fall back to TMDB's public base below
+        tmdb_config = None
+    base_url = tmdb_config["images"]["secure_base_url"] if tmdb_config else "https://image.tmdb.org/t/p/"
+    poster_size = get_poster_size(tmdb_config) if tmdb_config else get_config()["recommendations"]["poster_size"]
+    
+    # Genre names come from the genre lists, so items need no detail calls
+    genre_names = {}
+    for media_type in ("movie", "tv"):
+        response, data = tmdb_get(f"/genre/{media_type}/list", params={"language": "en-US"}, kind="quick_picks")
+        if data is not None:
+            genre_names.update({genre["id"]: genre["name"] for genre in data.get("genres", [])})
+    
+    items = {}
+    for content, media_type, path, params, label in QUICK_PICK_SOURCES:
+        response, data = tmdb_get(path, params={"language": "en-US", **params}, kind="quick_picks")
+        if data is None:
+            continue
+        for result in data.get("results", []):
+            key = (media_type, result["id"])
+            genre_ids = set(result.get("genre_ids", []))
+            if key in items or result.get("adult"):
+                continue
+            items[key] = {
+                "record": {
+                    "media_type": media_type,
+                    "id": result["id"],
+                    "title": result.get("title", result.get("name", "")),
+                    "date": result.get("release_date", result.get("first_air_date", "")),
+                    "overview": result.get("overview", ""),
+                    "poster_path": result.get("poster_path"),
+                    "genres": [genre_names[genre_id] for genre_id in result.get("genre_ids", []) if genre_id in genre_names],
+                    "popularity": result.get("popularity", 0)
+                },
+                "popularity": result.get("popularity", 0),
+                "content": "anime" if ANIMATION_GENRE_ID in genre_ids else content,
+                "language": result.get("original_language", ""),
+                "genres": [name for name, (_, ids) in GENRE_SEGMENTS.items() if genre_ids & ids],
+                "card": {
+                    "id": result["id"],
+                    "title": result.get("title", result.get("name", "")),
+                    "year": result.get("release_date", result.get("first_air_date", "")),
+                    "overview": result.get("overview", "Details not available."),
+                    "image_url": get_image_url(result.get("poster_path"), base_url, poster_size),
+                    "explanation": label,
+                    "media_type": media_type,
+                    "genres": [genre_names[genre_id] for genre_id in result.get("genre_ids", []) if genre_id in genre_names] or ["N/A"]
+                }
+            }
+    if not items:
+        raise RuntimeError("No quick picks could be fetched from TMDB")
+    
+    segments = {}
+    for item in sorted(items.values(), key=lambda item: item["popularity"], reverse=True):
+        for content in ("any", item["content"]):
+            for language in ("any", item["language"]):
+                for genre in ("any", *item["genres"]):
+                    picks = segments.setdefault((content, language, genre), [])
+                    if len(picks) < settings["per_segment"]:
+                        picks.append(item["card"])
+    
+    # Readers only ever see a complete pool
+    state["segments"] = segments
+    state["items"] = len(items)
+    state["refreshed_at"] = time.time()
+    state["last_error"] = None
+    
+    # Lets one refresher feed every worker on the host; off by default because
+    # it replaces whatever (possibly larger) snapshot is at the path
+    catalog = get_config()["catalog"]
+    if catalog["publish_quick_picks"] and catalog["snapshot_path"]:
+        from catalog_snapshot import write_snapshot
+        write_snapshot(catalog["snapshot_path"], [item["record"] for item in items.values()])
+
+def quick_picks_worker(state):
+    while True:
+        settings = get_config()["quick_picks"]
+        if settings["enabled"] and tmdb_api_key:
+            try:
+                refresh_quick_picks(state)
+            except Exception as e:
+                state["last_error"] = str(e)
+        time.sleep(settings["refresh_seconds"])
+
+# One pool and refresher thread per server process
+@st.cache_resource(show_spinner=False)
+def quick_picks_pool():
+    state = {"segments": {}, "items": 0, "refreshed_at": None, "last_error": None}
+    threading.Thread(target=quick_picks_worker, args=(state,), daemon=True).start()
+    return state
+
+# Best-matching ready picks for the answers so far, relaxing genre and then
+# language when a segment is too small
+def quick_picks(answers, count):
+    segments = quick_picks_pool()["segments"]
+    content, language, genre = persona_segment(answers)
+    for key in ((content, language, genre), (content, language, "any"), (content, "any", genre), (content, "any", "any")):
+        picks = segments.get(key, [])
+        if len(picks) >= count:
+            return picks[:count]
+    return segments.get(("any", "any", "any"), [])[:count]
+
+def render_quick_picks(picks, heading):
+    st.markdown(f"<h3>{heading}</h3>", unsafe_allow_html=True)
+    cols = st.columns(len(picks))
+    for col, rec in zip(cols, picks):
+        with col:
+            st.markdown(f"""
+            <div class='recommendation-card'>
+                <img src="{rec['image_url']}" alt="{rec['title']}" style="width:100%; border-radius:5px;">
+                <p><strong>{rec['title']}</strong> ({rec['year'][:4] if rec['year'] else 'N/A'})</p>
+                <p>{', '.join(rec['genres'][:2])} · {rec['explanation']}</p>
+            </div>
+            """, unsafe_allow_html=True)
+
+# Returning-user profiles: persona answers, like/dislike signals and a Bloom
+# filter of shown titles, stored per anonymous user id in a local SQLite file
+@st.cache_resource(show_spinner=False)
+def profile_store(path):
+    # Relative paths are relative to the app, like config.toml
+    import sqlite3
+    
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS profiles ("
+        "uid TEXT PRIMARY KEY, persona TEXT, signals TEXT, recent TEXT, seen BLOB, updated REAL, seen_hashes INTEGER)"
+    )
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(profiles)")]
+    if "seen_hashes" not in columns:
+        # Older files; their filters have no recorded hash count and start over
+        conn.execute("ALTER TABLE profiles ADD COLUMN seen_hashes INTEGER")
+    conn.commit()
+    return {"conn": conn, "lock": threading.Lock()}
+
+# Anonymous id from the ?uid= link or a svomo_uid cookie; new visitors get one
+# added to the URL so bookmarking or revisiting the link restores the profile
+def get_user_id():
+    import uuid
+    
+    uid = st.query_params.get("uid") or st.context.cookies.get("svomo_uid")
+    try:
+        uid = uuid.UUID(uid).hex
+    except (TypeError, ValueError):
+        uid = uuid.uuid4().hex
+    if st.query_params.get("uid") != uid:
+        st.query_params["uid"] = uid
+    return uid
+
+# `seen` is the Bloom filter and `seen_hashes` the hash count it was built
+# with; both come from config only when a filter starts out
+def empty_profile():
+    settings = get_config()["profiles"]
+    return {
+        "persona": {},
+        "signals": {"genres": {}, "types": {}},
+        "recent": [],
+        "seen": bytearray(settings["bloom_bits"] // 8),
+        "seen_hashes": settings["bloom_hashes"]
+    }
+
+def load_profile(uid):
+    store = profile_store(get_config()["profiles"]["path"])
+    with store["lock"]:
+        row = store["conn"].execute(
+            "SELECT persona, signals, recent, seen, seen_hashes FROM profiles WHERE uid = ?", (uid,)
+        ).fetchone()
+    profile = empty_profile()
+    if row:
+        profile["persona"] = json.loads(row[0])
+        profile["signals"] = json.loads(row[1])
+        profile["recent"] = json.loads(row[2])
+        # A filter built with another size or hash count starts over rather
+        # than giving wrong answers
+        if len(row[3]) == len(profile["seen"]) and row[4] == profile["seen_hashes"]:
+            profile["seen"] = bytearray(row[3])
+    return profile
+
+def save_profile(uid, profile):
+    store = profile_store(get_config()["profiles"]["path"])
+    with store["lock"]:
+        store["conn"].execute(
+            "INSERT OR REPLACE INTO profiles (uid, persona, signals, recent, seen, updated, seen_hashes) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                uid,
+                json.dumps(profile["persona"], separators=(",", ":")),
+                json.dumps(profile["signals"], separators=(",", ":")),
+                json.dumps(profile["recent"], separators=(",", ":")),
+                bytes(profile["seen"]),
+                time.time(),
+                profile["seen_hashes"]
+            )
+        )
+        store["conn"].commit()
+
+# Bit positions for a title; titles are matched by normalized name since pool
+# entries have no TMDB id until they are enriched
+def bloom_positions(title, bits, hashes):
+    import hashlib
+    
+    digest = hashlib.blake2b(" ".join(title.lower().split()).encode("utf-8"), digest_size=64).digest()
+    return [int.from_bytes(digest[4 * i:4 * i + 4], "little") % bits for i in range(hashes)]
+
+def seen_before(profile, title):
+    seen = profile["seen"]
+    return all(seen[bit >> 3] & (1 << (bit & 7)) for bit in bloom_positions(title, len(seen) * 8, profile["seen_hashes"]))
+
+def mark_seen(profile, title):
+    seen = profile["seen"]
+    for bit in bloom_positions(title, len(seen) * 8, profile["seen_hashes"]):
+        seen[bit >> 3] |= 1 << (bit & 7)
+
+# Remember the titles on a newly shown page. `candidates` are the pool
+# entries behind the cards, whose model-given titles can differ from TMDB's.
+def remember_shown(recs, candidates):
+    profile = st.session_state.get("profile")
+    if profile is None:
+        return
+    keep = get_config()["profiles"]["recent_titles"]
+    for candidate in candidates:
+        mark_seen(profile, candidate["title"])
+    for rec in recs:
+        mark_seen(profile, rec["title"])
+        profile["recent"].append(rec["title"])
+    profile["recent"] = profile["recent"][-keep:] if keep else []
+    save_profile(st.session_state.user_id, profile)
+
+# Genres of a pool entry, from the catalog snapshot when it has the title,
+# otherwise any known genre named in the model's explanation
+def candidate_genres(rec, known_genres):
+    catalog = get_catalog()
+    matches = catalog.search(rec["title"]) if catalog else []
+    if matches:
+        return [genre["name"] for genre in matches[0]["genres"]]
+    text = rec.get("explanation", "").lower()
+    return [genre for genre in known_genres if genre.lower() in text]
+
+# "movie" or "tv" for a model-given type, or for a card's media type (cards
+# not found on TMDB keep the model's type, e.g. "anime")
+def normalize_media_type(value):
+    return "tv" if value.lower() in ["show", "tv show", "tv", "series", "anime"] else "movie"
+
+def candidate_type(rec):
+    return normalize_media_type(rec["type"])
+
+def profile_score(rec, signals):
+    genres = candidate_genres(rec, signals["genres"])
+    return sum(signals["genres"].get(genre, 0) for genre in genres) + signals["types"].get(candidate_type(rec), 0)
+
+# Order a pool for this user by affinity, leaving out titles shown before.
+# Seen titles only come back to fill the last page when too few unseen ones
+# remain. The sort is stable, so the model's own ranking breaks ties. Returns
+# a new list; pools are shared across sessions.
+def personalize_pool(pool, profile):
+    signals = profile["signals"]
+    ranked = sorted(pool, key=lambda rec: -profile_score(rec, signals))
+    unseen = [rec for rec in ranked if not seen_before(profile, rec["title"])]
+    shortfall = get_config()["recommendations"]["max_recommendations"] - len(unseen)
+    if shortfall > 0:
+        unseen += [rec for rec in ranked if seen_before(profile, rec["title"])][:shortfall]
+    return unseen
+
+# Record a like or dislike and re-rank the part of the pool not shown yet
+def record_feedback(rec, liked):
+    profile = st.session_state.profile
+    signals = profile["signals"]
+    delta = 1 if liked else -1
+    for genre in rec["genres"]:
+        if genre != "N/A":
+            signals["genres"][genre] = signals["genres"].get(genre, 0) + delta
+    media_type = normalize_media_type(rec["media_type"])
+    signals["types"][media_type] = signals["types"].get(media_type, 0) + delta
+    save_profile(st.session_state.user_id, profile)
+    st.session_state.setdefault("feedback", {})[rec["title"]] = liked
+    
+    cursor = st.session_state.pool_cursor
+    remaining = st.session_state.candidate_pool[cursor:]
+    reranked = personalize_pool(remaining, profile)
+    if reranked != remaining:
+        st.session_state.candidate_pool = st.session_state.candidate_pool[:cursor] + reranked
+        # The prefetched page was for the old order
+        st.session_state.pop("prefetch", None)
+        start_prefetch(cursor)
+
 # Main application logic
 def main():
     # Header
     st.markdown("<h1>SVOMO RECOMMENDATION</h1>", unsafe_allow_html=True)
     
+    # Re-read on every run so edits to config.toml apply without a restart
+    config = get_config()
+    config_error = last_good_config()["error"]
+    if config_error:
+        st.error(f"⚠️ {config_error}. Using the last valid configuration.")
+    
+    # Shared, once-per-process startup work; instant after the first session
+    services = warmup()
+    if gemini_api_key and not services["gemini_available"] and backend_answered_since("gemini", services["checked_at"]):
+        # Gemini recovered after a failed startup check
+        services["gemini_available"] = True
+    if gemini_api_key and not services["gemini_available"]:
+        st.error("Gemini API health check failed; using the next available model backend.")
+    
     # Initialize session state
     if 'stage' not in st.session_state:
         st.session_state.stage = 'persona'
@@ -369,9 +2165,18 @@ def main():
     if 'recommendations' not in st.session_state:
         st.session_state.recommendations = []
     
+    # Returning users go straight to the mood questions
+    if config["profiles"]["enabled"] and 'profile' not in st.session_state:
+        st.session_state.user_id = get_user_id()
+        st.session_state.profile = load_profile(st.session_state.user_id)
+        if st.session_state.profile["persona"] and st.session_state.stage == 'persona' and not st.session_state.persona:
+            st.session_state.persona = dict(st.session_state.profile["persona"])
+            st.session_state.stage = 'mood'
+    
     # Get TMDB configuration
     if 'tmdb_config' not in st.session_state:
-        tmdb_config = get_tmdb_config()
+        # Retry on this session if the warmup fetch failed
+        tmdb_config = services["tmdb_config"] or get_tmdb_config()
         if tmdb_config:
             st.session_state.tmdb_config = tmdb_config
         else:
@@ -385,33 +2190,20 @@ def main():
     
     # STAGE 1: User Persona Collection - One question at a time
     if st.session_state.stage == 'persona':        
+        # Instant picks from the background pool while the questions load
+        if config["quick_picks"]["enabled"]:
+            answered_ids = {q["id"] for q in st.session_state.get("persona_questions", [])[:st.session_state.question_index]}
+            answers = {key: value for key, value in st.session_state.persona.items() if key in answered_ids}
+            picks = quick_picks(answers, config["recommendations"]["max_recommendations"])
+            if picks:
+                render_quick_picks(picks, "Picked for you so far" if answers else "Popular right now")
+        
         # Define persona questions if they don't exist yet
         if 'persona_questions' not in st.session_state:
             # Fallback questions defined first to ensure they're always available
-            st.session_state.persona_questions = [
-                {
-                    "id": "content_type",
-                    "text": "Do you prefer watching anime or movies?",
-                    "options": ["Anime", "Movies", "Both equally"]
-                },
-                {
-                    "id": "preferred_genres",
-                    "text": "Which genres do you usually enjoy watching?",
-                    "options": ["Action/Adventure", "Drama/Romance", "Comedy", "Sci-Fi/Fantasy"]
-                },
-                {
-                    "id": "language_preference",
-                    "text": "Which language content do you prefer?",
-                    "options": ["English", "Japanese", "Korean", "Bollywood/Hindi", "Multiple languages"]
-                },
-                {
-                    "id": "viewing_frequency",
-                    "text": "How often do you watch movies or shows?",
-                    "options": ["Daily", "Few times a week", "Weekends only", "Occasionally"]
-                }
-            ]
+            st.session_state.persona_questions = FALLBACK_PERSONA_QUESTIONS
             
-            # Try to get personalized questions from Gemini
+            # Try to get personalized questions from the routed model backends
             with st.spinner("Loading..."):
                 st.markdown("""
                 <div class="loading-container">
@@ -419,38 +2211,14 @@ def main():
                 </div>
                 """, unsafe_allow_html=True)
                 
-                if gemini_available:
-                    prompt = """
-                    Generate 4 questions to understand a user's movie/anime watching preferences.
-                    First question must ask if they prefer anime or movies.
-                    Return the result as a JSON with this structure ONLY:
-                    {
-                        "questions": [
-                            {
-                                "id": "q1",
-                                "text": "Question text here",
-                                "options": ["Option 1", "Option 2", "Option 3"]
-                            },
-                            {
-                                "id": "q2",
-                                ...
-                            }
-                        ]
-                    }
-                    The response must be valid JSON and nothing else.
-                    """
-                    try:
-                        response_text = call_gemini_api(prompt)
-                        if response_text:
-                            # Find JSON in the response
-                            json_start = response_text.find('{')
-                            json_end = response_text.rfind('}') + 1
-                            if json_start >= 0 and json_end > json_start:
-                                json_str = response_text[json_start:json_end]
-                                questions_json = json.loads(json_str)
-                                st.session_state.persona_questions = questions_json["questions"]
-                    except Exception as e:
-                        pass
+                try:
+                    questions_json = run_prompt("persona_questions", count=config["questions"]["persona_count"])
+                    if questions_json:
+                        st.session_state.persona_questions = questions_json["questions"]
+                except Exception as e:
+                    pass
+            
+            st.session_state.persona_questions = st.session_state.persona_questions[:config["questions"]["persona_count"]]
         
         # Display one persona question at a time
         if st.session_state.question_index < len(st.session_state.persona_questions):
@@ -483,6 +2251,10 @@ def main():
                 st.session_state.question_index += 1
                 st.rerun()
         else:
+            if 'profile' in st.session_state:
+                st.session_state.profile["persona"] = dict(st.session_state.persona)
+                save_profile(st.session_state.user_id, st.session_state.profile)
+            
             # Move to mood questions
             st.session_state.stage = 'mood'
             st.session_state.question_index = 0
@@ -493,28 +2265,7 @@ def main():
         # Generate mood questions if they don't exist yet
         if 'mood_questions' not in st.session_state:
             # Fallback mood questions defined first
-            st.session_state.mood_questions = [
-                {
-                    "id": "social_context",
-                    "text": "Who are you watching with?",
-                    "options": ["Alone", "With friend(s)", "With family", "With partner"]
-                },
-                {
-                    "id": "current_mood",
-                    "text": "What's your current mood?",
-                    "options": ["Happy/Excited", "Relaxed/Chill", "Sad/Emotional", "Thoughtful/Introspective"]
-                },
-                {
-                    "id": "available_time",
-                    "text": "How much time do you have available?",
-                    "options": ["Under 2 hours", "2-3 hours", "Multiple sessions", "Binge-watch a series"]
-                },
-                {
-                    "id": "content_theme",
-                    "text": "What theme are you interested in right now?",
-                    "options": ["Love/Romance", "Action/Excitement", "Mystery/Suspense", "Escapism/Fantasy"]
-                }
-            ]
+            st.session_state.mood_questions = FALLBACK_MOOD_QUESTIONS
             
             # Try to get personalized questions based on persona
             with st.spinner("Loading..."):
@@ -524,52 +2275,26 @@ def main():
                 </div>
                 """, unsafe_allow_html=True)
                 
-                persona_json = json.dumps(st.session_state.persona)
-                if gemini_available:
-                    # Customize the prompt based on previous answers
-                    content_type = st.session_state.persona.get("content_type", "")
-                    preferred_genres = st.session_state.persona.get("preferred_genres", "")
-                    
-                    prompt = f"""
-                    Based on this user persona: {persona_json}
-                    
-                    The user prefers {content_type} and enjoys {preferred_genres}.
-                    
-                    Generate 4 tailored questions to understand what kind of {content_type.lower()} the user wants to watch right now.
-                    Include questions about:
-                    - Who they're watching with
-                    - Their current mood
-                    - Time available for watching
-                    - Themes they're interested in
-
-                    Return the result as a JSON with this structure ONLY:
-                    {{
-                        "questions": [
-                            {{
-                                "id": "q1",
-                                "text": "Question text here",
-                                "options": ["Option 1", "Option 2", "Option 3", "Option 4"]
-                            }},
-                            {{
-                                "id": "q2",
-                                ...
-                            }}
-                        ]
-                    }}
-                    The response must be valid JSON and nothing else.
-                    """
-                    try:
-                        response_text = call_gemini_api(prompt)
-                        if response_text:
-                            # Find JSON in the response
-                            json_start = response_text.find('{')
-                            json_end = response_text.rfind('}') + 1
-                            if json_start >= 0 and json_end > json_start:
-                                json_str = response_text[json_start:json_end]
-                                questions_json = json.loads(json_str)
-                                st.session_state.mood_questions = questions_json["questions"]
-                    except Exception as e:
-                        pass
+                persona_json = json.dumps(st.session_state.persona, separators=(",", ":"))
+                # Customize the prompt based on previous answers
+                content_type = st.session_state.persona.get("content_type", "")
+                preferred_genres = st.session_state.persona.get("preferred_genres", "")
+                
+                try:
+                    questions_json = run_prompt(
+                        "mood_questions",
+                        count=config["questions"]["mood_count"],
+                        persona_json=persona_json,
+                        content_type=content_type,
+                        content_type_lower=content_type.lower(),
+                        preferred_genres=preferred_genres
+                    )
+                    if questions_json:
+                        st.session_state.mood_questions = questions_json["questions"]
+                except Exception as e:
+                    pass
+            
+            st.session_state.mood_questions = st.session_state.mood_questions[:config["questions"]["mood_count"]]
         
         # Display one mood question at a time
         if st.session_state.question_index < len(st.session_state.mood_questions):
@@ -606,7 +2331,8 @@ def main():
                     else:
                         # Go back to persona questions
                         st.session_state.stage = 'persona'
-                        st.session_state.question_index = len(st.session_state.persona_questions) - 1
+                        # Returning users skipped these, so they start from the first one
+                        st.session_state.question_index = max(0, len(st.session_state.get("persona_questions", [])) - 1)
                     st.rerun()
             
             with col2:
@@ -637,188 +2363,57 @@ def main():
         """, unsafe_allow_html=True)
         
         # Generate recommendations based on user inputs
-        persona_json = json.dumps(st.session_state.persona)
-        mood_json = json.dumps(st.session_state.mood_context)
+        persona_json = json.dumps(st.session_state.persona, separators=(",", ":"), sort_keys=True)
+        mood_json = json.dumps(st.session_state.mood_context, separators=(",", ":"), sort_keys=True)
         
         # Default recommendations in case of API failure
-        recommendations_data = {
-            "recommendations": [
-                {
-                    "title": "The Matrix",
-                    "year": "1999",
-                    "type": "movie",
-                    "explanation": "A classic sci-fi film with groundbreaking visual effects and a thought-provoking story."
-                },
-                {
-                    "title": "Stranger Things",
-                    "year": "2016",
-                    "type": "show",
-                    "explanation": "A nostalgic sci-fi series with great characters and supernatural mysteries."
-                },
-                {
-                    "title": "Spirited Away",
-                    "year": "2001",
-                    "type": "anime",
-                    "explanation": "A beautifully animated fantasy film with rich storytelling and captivating visuals."
-                }
-            ]
-        }
+        recommendations_data = {"recommendations": FALLBACK_RECOMMENDATIONS}
         
         # Special case for anime fans based on persona
         is_anime_fan = "Anime" in st.session_state.persona.get("content_type", "")
         
-        with st.spinner(""):
-            if gemini_available:
-                # Customize prompt based on collected data
-                content_preference = st.session_state.persona.get("content_type", "")
-                genre_preference = st.session_state.persona.get("preferred_genres", "")
-                mood = st.session_state.mood_context.get("current_mood", "")
-                
-                prompt = f"""
-                Based on this user persona: {persona_json}
-                And their current mood/context: {mood_json}
-                
-                The user prefers {content_preference} and enjoys {genre_preference} genres. 
-                They are currently feeling {mood}.
-                
-                Recommend exactly 3 {'anime series or movies' if is_anime_fan else 'movies or shows'} that would perfectly match these preferences.
-                
-                For each recommendation, provide:
-                1. Title (exact spelling is important)
-                2. Year of release (if known)
-                3. Type (movie, TV show, or anime)
-                4. A brief explanation of why this would appeal to this specific user based on their preferences and current mood
-
-                Return the response in this JSON format ONLY:
-                {{
-                    "recommendations": [
-                        {{
-                            "title": "Title here",
-                            "year": "Year here or null",
-                            "type": "movie/show/anime",
-                            "explanation": "Why this recommendation matches their preferences"
-                        }},
-                        ...
-                    ]
-                }}
-                The response must be valid JSON and nothing else.
-                """
-                
-                try:
-                    response_text = call_gemini_api(prompt)
-                    if response_text:
-                        # Find JSON in the response
-                        json_start = response_text.find('{')
-                        json_end = response_text.rfind('}') + 1
-                        if json_start >= 0 and json_end > json_start:
-                            json_str = response_text[json_start:json_end]
-                            try:
-                                recommendations_data = json.loads(json_str)
-                            except json.JSONDecodeError as e:
-                                pass
-                except Exception as e:
-                    pass
-            else:
-                # If Gemini API is not available, use fallback recommendations that match persona
-                if is_anime_fan:
-                    recommendations_data = {
-                        "recommendations": [
-                            {
-                                "title": "My Hero Academia",
-                                "year": "2016",
-                                "type": "anime",
-                                "explanation": "A popular anime about superheroes with great action and character development."
-                            },
-                            {
-                                "title": "Your Name",
-                                "year": "2016",
-                                "type": "anime",
-                                "explanation": "A beautiful anime film with stunning visuals and an emotional story."
-                            },
-                            {
-                                "title": "Attack on Titan",
-                                "year": "2013",
-                                "type": "anime",
-                                "explanation": "An intense, dark anime with incredible action sequences and a gripping plot."
-                            }
-                        ]
-                    }
-        
-        # Process each recommendation and get details from TMDB
-        processed_recommendations = []
+        # Wait for an upstream slot, showing the queue position
+        token = None
+        if config["admission"]["enabled"]:
+            queue_notice = st.empty()
+            token = admit_search(lambda position: queue_notice.markdown(
+                f'<div class="question-text">Lots of people are looking for something to watch. '
+                f'You are number {position} in line...</div>',
+                unsafe_allow_html=True
+            ))
+            queue_notice.empty()
         
-        for rec in recommendations_data["recommendations"]:
-            # Determine media type for API
-            media_type = "movie"
-            if rec["type"].lower() in ["show", "tv show", "tv", "series"]:
-                media_type = "tv"
-            elif rec["type"].lower() == "anime":
-                media_type = "tv"  # Most anime are categorized as TV shows in TMDB
-            
-            # Search for the title with enhanced handling for anime
-            search_results = search_movies(rec["title"], media_type)
-            
-            if search_results and search_results.get("results", []):
-                # Get the first result
-                result = search_results["results"][0]
-                movie_id = result["id"]
-                
-                # Get detailed information
-                details = get_movie_details(movie_id, media_type)
-                
-                if details:
-                    # Get image URL
-                    base_url = st.session_state.tmdb_config["images"]["secure_base_url"]
-                    poster_size = st.session_state.tmdb_config["images"]["poster_sizes"][3]  # Medium size
-                    image_url = get_image_url(details.get("poster_path"), base_url, poster_size)
-                    
-                    # Create recommendation object
-                    recommendation = {
-                        "id": movie_id,
-                        "title": details.get("title", details.get("name", rec["title"])),
-                        "year": details.get("release_date", details.get("first_air_date", rec.get("year", ""))),
-                        "overview": details.get("overview", "Details not available."),
-                        "image_url": image_url,
-                        "explanation": rec["explanation"],
-                        "media_type": media_type,
-                        "genres": [genre["name"] for genre in details.get("genres", [])] or ["N/A"]
-                    }
+        if token or not config["admission"]["enabled"]:
+            try:
+                with st.spinner(""):
+                    # One ranked candidate pool per answer set, shared across sessions
+                    pool = get_candidate_pool(persona_json, mood_json, is_anime_fan)
+                    if pool:
+                        recommendations_data = {"recommendations": pool}
+                    elif is_anime_fan:
+                        # If every model backend failed, use fallback recommendations that match persona
+                        recommendations_data = {"recommendations": FALLBACK_ANIME_RECOMMENDATIONS}
                     
-                    processed_recommendations.append(recommendation)
-                else:
-                    # Create a basic recommendation with the search result data
-                    poster_path = result.get("poster_path")
-                    base_url = st.session_state.tmdb_config["images"]["secure_base_url"]
-                    poster_size = st.session_state.tmdb_config["images"]["poster_sizes"][3]
-                    image_url = get_image_url(poster_path, base_url, poster_size)
-                    
-                    recommendation = {
-                        "id": movie_id,
-                        "title": result.get("title", result.get("name", rec["title"])),
-                        "year": result.get("release_date", result.get("first_air_date", rec.get("year", ""))),
-                        "overview": result.get("overview", "Details not available."),
-                        "image_url": image_url,
-                        "explanation": rec["explanation"],
-                        "media_type": media_type,
-                        "genres": ["N/A"]  # We don't have genre information from search
-                    }
-                    
-                    processed_recommendations.append(recommendation)
-            else:
-                # If TMDB search fails, create a basic recommendation with fallback image
-                recommendation = {
-                    "id": 0,
-                    "title": rec["title"],
-                    "year": rec.get("year", ""),
-                    "overview": "Details not available from our database, but this is a great match for your preferences!",
-                    "image_url": "https://i.ibb.co/s9ZYS5wk/45e6544ed099.jpg",  # Use provided fallback image
-                    "explanation": rec["explanation"],
-                    "media_type": rec["type"].lower(),
-                    "genres": ["N/A"]
-                }
-                processed_recommendations.append(recommendation)
+                    # Enrich only the first page now; later pages come from the pool
+                    st.session_state.candidate_pool = recommendations_data["recommendations"]
+                    if 'profile' in st.session_state:
+                        st.session_state.candidate_pool = personalize_pool(st.session_state.candidate_pool, st.session_state.profile)
+                    st.session_state.pool_cursor = 0
+                    st.session_state.recommendations = []
+                    load_next_page(token)
+                    # The prefetch of the next page now holds the slot
+                    token = None
+                    st.session_state.shed = False
+            finally:
+                if token:
+                    release_search(token)
+        else:
+            # Overloaded: serve local recommendations without upstream calls
+            st.session_state.recommendations = shed_recommendations(persona_json, mood_json, is_anime_fan)
+            st.session_state.candidate_pool = []
+            st.session_state.pool_cursor = 0
+            st.session_state.shed = True
         
-        st.session_state.recommendations = processed_recommendations
         st.session_state.stage = 'results'
         st.rerun()
     
@@ -832,22 +2427,73 @@ def main():
                     del st.session_state[key]
                 st.rerun()
         else:
-            # Display recommendations in enhanced cards
-            cols = st.columns(len(st.session_state.recommendations))
-            
+            # Display recommendations in enhanced cards, one row per page
+            page_size = config["recommendations"]["max_recommendations"]
+            card_options = config["recommendations"]
             for i, rec in enumerate(st.session_state.recommendations):
-                with cols[i]:
+                if i == 0 or rec.get("page") != st.session_state.recommendations[i - 1].get("page"):
+                    page_length = sum(1 for other in st.session_state.recommendations if other.get("page") == rec.get("page"))
+                    cols = st.columns(max(page_size, page_length))
+                    page_start = i
+                with cols[i - page_start]:
+                    genres_html = f"<p><strong>Genres:</strong> {', '.join(rec['genres']) if rec['genres'] else 'N/A'}</p>" if card_options["include_genres"] else ""
+                    overview_html = f"<p>{rec['overview']}</p>" if card_options["include_overview"] else ""
+                    explanation_html = f"""<div style="margin-top:15px; padding:15px; border-left: 2px solid #8a2be2;">
+                            <p><strong>Why we recommend this:</strong> {rec['explanation']}</p>
+                        </div>""" if card_options["include_explanation"] else ""
                     st.markdown(f"""
                     <div class='recommendation-card'>
                         <h3>{rec['title']}</h3>
                         <p><strong>Year:</strong> {rec['year'][:4] if rec['year'] else 'N/A'}</p>
                         <img src="{rec['image_url']}" alt="{rec['title']}" style="width:100%; border-radius:5px; margin:10px 0;">
-                        <p><strong>Genres:</strong> {', '.join(rec['genres']) if rec['genres'] else 'N/A'}</p>
-                        <div style="margin-top:15px; padding:15px; border-left: 2px solid #8a2be2;">
-                            <p><strong>Why we recommend this:</strong> {rec['explanation']}</p>
-                        </div>
+                        {genres_html}
+                        {overview_html}
+                        {explanation_html}
                     </div>
                     """, unsafe_allow_html=True)
+                    
+                    # Heavy sections are only fetched once the user asks for them
+                    if rec["id"]:
+                        expanded = st.session_state.setdefault("expanded_cards", set())
+                        card_key = (rec["media_type"], rec["id"])
+                        if card_key in expanded:
+                            if st.button("Hide details", key=f"collapse_{i}"):
+                                expanded.discard(card_key)
+                                st.rerun()
+                            render_card_sections(rec)
+                        elif st.button("More details", key=f"expand_{i}"):
+                            expanded.add(card_key)
+                            st.rerun()
+                    
+                    # Likes and dislikes re-rank the titles not shown yet
+                    if 'profile' in st.session_state:
+                        liked = st.session_state.get("feedback", {}).get(rec["title"])
+                        if liked is None:
+                            like_col, dislike_col = st.columns(2)
+                            with like_col:
+                                if st.button("Like", key=f"like_{i}"):
+                                    record_feedback(rec, True)
+                                    st.rerun()
+                            with dislike_col:
+                                if st.button("Not for me", key=f"dislike_{i}"):
+                                    record_feedback(rec, False)
+                                    st.rerun()
+                        else:
+                            st.caption("You liked this" if liked else "We'll show less like this")
+            
+            if st.session_state.get("shed"):
+                st.info("We're busy right now, so these are quick picks from our own catalog.")
+                if st.button("Try again for personalized picks"):
+                    st.session_state.stage = 'searching'
+                    st.rerun()
+            
+            # Next page comes straight from the cached pool, usually already prefetched
+            if st.session_state.pool_cursor < len(st.session_state.candidate_pool):
+                if st.button("Load more"):
+                    load_next_page()
+                    st.rerun()
+            
+            render_diagnostics()
             
             # Restart button with enhanced styling
             if st.button("Start Over"):
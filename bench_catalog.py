@@ -0,0 +1,151 @@
+"""Benchmark for the memory-mapped catalog snapshot.
+
+Builds a synthetic snapshot and measures:
+  * open time (mmap + header parse)
+  * id lookup and title search latency
+  * per-worker memory with N worker processes that each touch every row,
+    compared with workers that each load the same records from JSON
+
+Usage:
+    python bench_catalog.py --rows 100000 --workers 4
+
+Memory figures come from /proc and are skipped on other platforms. With the
+snapshot, shared file-backed pages count towards each worker's RSS but are
+split in PSS; private (anonymous) memory is what grows per worker.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from catalog_snapshot import CatalogSnapshot, write_snapshot
+
+GENRES = ["Action", "Adventure", "Animation", "Comedy", "Drama", "Fantasy", "Romance", "Science Fiction"]
+
+
+def synthetic_records(rows):
+    rng = random.Random(42)
+    for i in range(rows):
+        yield {
+            "media_type": "movie" if i % 3 else "tv",
+            "id": i + 1,
+            "title": f"Title {i} {rng.choice(GENRES)}",
+            "date": f"{rng.randint(1950, 2025)}-01-01",
+            "overview": " ".join(rng.choice(GENRES).lower() for _ in range(40)),
+            "poster_path": f"/poster{i}.jpg",
+            "genres": rng.sample(GENRES, 2),
+            "popularity": rng.random() * 100
+        }
+
+
+def memory_stats():
+    """Return RSS, anonymous RSS and PSS in MB for this process, if /proc is available."""
+    stats = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "RssAnon:")):
+                    name, value = line.split()[:2]
+                    stats[name.rstrip(":")] = int(value) / 1024
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    stats["Pss"] = int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return {name: round(value, 1) for name, value in stats.items()}
+
+
+def snapshot_worker(path, rows, results):
+    snapshot = CatalogSnapshot(path)
+    for i in range(rows):
+        snapshot.get("movie" if i % 3 else "tv", i + 1)
+    results.put(memory_stats())
+
+
+def json_worker(path, rows, results):
+    with open(path, encoding="utf-8") as f:
+        catalog = {(record["media_type"], record["id"]): record for record in map(json.loads, f)}
+    for i in range(rows):
+        catalog.get(("movie" if i % 3 else "tv", i + 1))
+    results.put(memory_stats())
+
+
+def run_workers(target, path, rows, workers):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [context.Process(target=target, args=(path, rows, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    stats = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    if None in stats:
+        return None
+    return {name: round(statistics.mean(stat[name] for stat in stats), 1) for name in stats[0]}
+
+
+def percentile_us(samples, fraction):
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1e6, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--lookups", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = os.path.join(tmp, "catalog.snap")
+        jsonl_path = os.path.join(tmp, "catalog.jsonl")
+        with open(jsonl_path, "w", encoding="utf-8") as f:
+            for record in synthetic_records(args.rows):
+                f.write(json.dumps(record) + "\n")
+        start = time.perf_counter()
+        write_snapshot(snapshot_path, synthetic_records(args.rows))
+        build_s = time.perf_counter() - start
+
+        open_times = []
+        for _ in range(20):
+            start = time.perf_counter()
+            snapshot = CatalogSnapshot(snapshot_path)
+            open_times.append(time.perf_counter() - start)
+
+        rng = random.Random(7)
+        ids = [rng.randrange(args.rows) for _ in range(args.lookups)]
+        lookup_times = []
+        for i in ids:
+            start = time.perf_counter()
+            snapshot.get("movie" if i % 3 else "tv", i + 1)
+            lookup_times.append(time.perf_counter() - start)
+        search_times = []
+        for i in ids[:2000]:
+            title = snapshot.get("movie" if i % 3 else "tv", i + 1)
+            title = title.get("title", title.get("name"))
+            start = time.perf_counter()
+            snapshot.search(title)
+            search_times.append(time.perf_counter() - start)
+
+        results = {
+            "rows": args.rows,
+            "snapshot_mb": round(os.path.getsize(snapshot_path) / 2 ** 20, 1),
+            "build_s": round(build_s, 2),
+            "open_ms_median": round(statistics.median(open_times) * 1000, 3),
+            "lookup_us": {"p50": percentile_us(lookup_times, 0.5), "p99": percentile_us(lookup_times, 0.99)},
+            "search_us": {"p50": percentile_us(search_times, 0.5), "p99": percentile_us(search_times, 0.99)},
+            "per_worker_mb": {
+                "snapshot": run_workers(snapshot_worker, snapshot_path, args.rows, args.workers),
+                "json": run_workers(json_worker, jsonl_path, args.rows, args.workers)
+            }
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
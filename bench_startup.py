@@ -0,0 +1,103 @@
+"""Startup-time benchmark for the SVOMO app.
+
+Measures, in fresh interpreters:
+  * import time of the modules app.py loads at startup
+  * the first (cold) script run of app.py, without API keys so no upstream
+    calls are made
+
+Usage:
+    python bench_startup.py --runs 5 --max-import-ms 1500 --max-first-run-ms 5000
+
+Prints a JSON summary and exits with status 1 if a median exceeds its budget,
+so it can run as a CI step.
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def startup_imports(path=os.path.join(APP_DIR, "app.py")):
+    """Modules a script imports at module level, as an `import` statement list.
+
+    Imports inside functions are lazy and left out. The app's Diagnostics
+    panel profiles the same list.
+    """
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            names = [node.module]
+        else:
+            continue
+        modules += [name for name in names if name not in modules]
+    return ", ".join(modules)
+
+
+FIRST_RUN_SCRIPT = """
+import time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=60)
+at.run()
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+def time_imports():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {startup_imports()}"], check=True, cwd=APP_DIR)
+    return (time.perf_counter() - start) * 1000
+
+
+def time_first_run():
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_RUN_SCRIPT],
+        check=True, capture_output=True, text=True, cwd=APP_DIR
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(ordered), 1),
+        "max_ms": round(ordered[-1], 1),
+        "min_ms": round(ordered[0], 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-first-run-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    results = {
+        "imports": summarize([time_imports() for _ in range(args.runs)]),
+        "first_run": summarize([time_first_run() for _ in range(args.runs)])
+    }
+    print(json.dumps(results, indent=2))
+
+    failed = False
+    if args.max_import_ms is not None and results["imports"]["median_ms"] > args.max_import_ms:
+        print(f"Import time over budget: {results['imports']['median_ms']} ms > {args.max_import_ms} ms", file=sys.stderr)
+        failed = True
+    if args.max_first_run_ms is not None and results["first_run"]["median_ms"] > args.max_first_run_ms:
+        print(f"First run over budget: {results['first_run']['median_ms']} ms > {args.max_first_run_ms} ms", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""Read-only, memory-mapped TMDB catalog snapshot shared by every worker.
+
+Several Streamlit processes on one host can open the same snapshot file.
+Each one maps it read-only, so the OS page cache holds a single copy and
+worker RSS stays flat as workers are added. New snapshots are published by
+writing a temporary file and renaming it over the old one. Readers notice
+the swap and remap; mappings of the old file stay valid until they are
+dropped.
+
+File layout (little-endian, sections 8-byte aligned):
+
+    header        magic, version, row count, string count, section offsets
+    keys          u64 per row, (media code << 32) | TMDB id, sorted: the id index
+    title         u32 string id per row
+    norm_title    u32 string id per row (lowercase, punctuation folded)
+    date          u32 string id per row (release or first air date)
+    overview      u32 string id per row
+    poster        u32 string id per row
+    genres        u32 string id per row (genre names joined with "|")
+    popularity    f32 per row
+    title_order   u32 row numbers sorted by norm_title, most popular first
+    str_offsets   u64 per string + 1, into str_blob
+    str_blob      UTF-8 bytes of the deduplicated string table
+
+Usage:
+    python catalog_snapshot.py build records.jsonl catalog.snap
+    python catalog_snapshot.py info catalog.snap
+
+Each JSONL record has media_type ("movie" or "tv"), id, title, date,
+overview, poster_path, genres (list of names) and popularity.
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+MAGIC = b"SVOMOCT1"
+VERSION = 1
+SECTIONS = (
+    "keys", "title", "norm_title", "date", "overview", "poster", "genres",
+    "popularity", "title_order", "str_offsets", "str_blob"
+)
+HEADER = struct.Struct("<8sIII4x" + "Q" * len(SECTIONS))
+MEDIA_CODES = {"movie": 0, "tv": 1}
+MEDIA_TYPES = {code: media_type for media_type, code in MEDIA_CODES.items()}
+
+if sys.byteorder != "little":
+    raise ImportError("catalog snapshots are only supported on little-endian hosts")
+
+
+def make_key(media_type, tmdb_id):
+    return (MEDIA_CODES[media_type] << 32) | int(tmdb_id)
+
+
+def normalize_title(title):
+    return " ".join(re.sub(r"[^\w]+", " ", title.lower()).split())
+
+
+def write_snapshot(path, records):
+    """Write `records` to `path` atomically and return the row count."""
+    rows = {}
+    for record in records:
+        rows[make_key(record["media_type"], record["id"])] = record
+    keys = sorted(rows)
+
+    strings = {}
+    string_list = []
+
+    def intern(value):
+        value = value or ""
+        if value not in strings:
+            strings[value] = len(string_list)
+            string_list.append(value)
+        return strings[value]
+
+    columns = {name: array("I") for name in ("title", "norm_title", "date", "overview", "poster", "genres")}
+    popularity = array("f")
+    norm_titles = []
+    for key in keys:
+        record = rows[key]
+        norm = normalize_title(record.get("title", ""))
+        norm_titles.append(norm)
+        columns["title"].append(intern(record.get("title")))
+        columns["norm_title"].append(intern(norm))
+        columns["date"].append(intern(record.get("date")))
+        columns["overview"].append(intern(record.get("overview")))
+        columns["poster"].append(intern(record.get("poster_path")))
+        columns["genres"].append(intern("|".join(record.get("genres", []))))
+        popularity.append(float(record.get("popularity", 0)))
+    title_order = array("I", sorted(range(len(keys)), key=lambda row: (norm_titles[row], -popularity[row])))
+
+    blob = bytearray()
+    str_offsets = array("Q", [0])
+    for value in string_list:
+        blob += value.encode("utf-8")
+        str_offsets.append(len(blob))
+
+    sections = {
+        "keys": array("Q", keys).tobytes(),
+        **{name: column.tobytes() for name, column in columns.items()},
+        "popularity": popularity.tobytes(),
+        "title_order": title_order.tobytes(),
+        "str_offsets": str_offsets.tobytes(),
+        "str_blob": bytes(blob)
+    }
+
+    offsets = []
+    position = HEADER.size
+    for name in SECTIONS:
+        position += -position % 8
+        offsets.append(position)
+        position += len(sections[name])
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(keys), len(string_list), *offsets))
+        for name, offset in zip(SECTIONS, offsets):
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(sections[name])
+        f.flush()
+        os.fsync(f.fileno())
+    # Atomic swap: readers see either the old file or the new one
+    os.replace(tmp_path, path)
+    return len(keys)
+
+
+class CatalogSnapshot:
+    """Zero-copy reader over a snapshot file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self._identity = (stat.st_ino, stat.st_mtime_ns)
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mmap)
+        magic, version, rows, string_count, *offsets = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} catalog snapshot")
+        self.rows = rows
+        sizes = {
+            "keys": 8 * rows, "popularity": 4 * rows, "title_order": 4 * rows,
+            "str_offsets": 8 * (string_count + 1)
+        }
+        sections = dict(zip(SECTIONS, offsets))
+        self._blob = buf[sections["str_blob"]:]
+        self._views = {}
+        for name, offset in sections.items():
+            if name == "str_blob":
+                continue
+            fmt = {"keys": "Q", "str_offsets": "Q", "popularity": "f"}.get(name, "I")
+            self._views[name] = buf[offset:offset + sizes.get(name, 4 * rows)].cast(fmt)
+
+    def is_stale(self):
+        """True once a newer snapshot has been swapped in at our path."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) != self._identity
+
+    def close(self):
+        for view in self._views.values():
+            view.release()
+        self._blob.release()
+        self._mmap.close()
+
+    def _string(self, string_id):
+        offsets = self._views["str_offsets"]
+        return str(self._blob[offsets[string_id]:offsets[string_id + 1]], "utf-8")
+
+    def _row(self, row):
+        views = self._views
+        key = views["keys"][row]
+        media_type = MEDIA_TYPES[key >> 32]
+        genres = self._string(views["genres"][row])
+        title_field, date_field = ("title", "release_date") if media_type == "movie" else ("name", "first_air_date")
+        return {
+            "id": key & 0xFFFFFFFF,
+            "media_type": media_type,
+            title_field: self._string(views["title"][row]),
+            date_field: self._string(views["date"][row]),
+            "overview": self._string(views["overview"][row]),
+            "poster_path": self._string(views["poster"][row]) or None,
+            "genres": [{"name": name} for name in genres.split("|")] if genres else [],
+            "popularity": views["popularity"][row]
+        }
+
+    def get(self, media_type, tmdb_id):
+        """Card fields for one title, shaped like a TMDB details payload, or None."""
+        keys = self._views["keys"]
+        key = make_key(media_type, tmdb_id)
+        row = bisect_left(keys, key)
+        if row < self.rows and keys[row] == key:
+            return self._row(row)
+        return None
+
+    def search(self, query, media_type=None, limit=5):
+        """Exact (normalized) title matches, most popular first."""
+        norm = normalize_title(query)
+        order = self._views["title_order"]
+        norm_title = self._views["norm_title"]
+
+        def title_of(row):
+            return self._string(norm_title[row])
+
+        start = bisect_left(order, norm, key=title_of)
+        end = bisect_right(order, norm, key=title_of, lo=start)
+        results = []
+        for index in range(start, end):
+            record = self._row(order[index])
+            if media_type is None or record["media_type"] == media_type:
+                results.append(record)
+            if len(results) >= limit:
+                break
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a snapshot from JSONL records")
+    build.add_argument("records")
+    build.add_argument("snapshot")
+    info = commands.add_parser("info", help="print snapshot statistics")
+    info.add_argument("snapshot")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        with open(args.records, encoding="utf-8") as f:
+            rows = write_snapshot(args.snapshot, (json.loads(line) for line in f if line.strip()))
+        print(f"Wrote {rows} rows to {args.snapshot} in {time.perf_counter() - start:.2f}s")
+    else:
+        snapshot = CatalogSnapshot(args.snapshot)
+        print(json.dumps({"rows": snapshot.rows, "bytes": os.path.getsize(args.snapshot)}))
+
+
+if __name__ == "__main__":
+    main()
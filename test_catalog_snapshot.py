@@ -0,0 +1,117 @@
+"""Round-trip checks for the catalog snapshot format.
+
+Run with `python -m pytest test_catalog_snapshot.py`.
+"""
+import os
+
+from catalog_snapshot import CatalogSnapshot, write_snapshot
+
+
+def record(media_type, tmdb_id, title, **fields):
+    return {
+        "media_type": media_type,
+        "id": tmdb_id,
+        "title": title,
+        "date": fields.get("date", "2001-01-01"),
+        "overview": fields.get("overview", f"About {title}"),
+        "poster_path": fields.get("poster_path", f"/{tmdb_id}.jpg"),
+        "genres": fields.get("genres", ["Drama"]),
+        "popularity": fields.get("popularity", 1.0)
+    }
+
+
+def build(tmp_path, records, name="catalog.snap"):
+    path = str(tmp_path / name)
+    write_snapshot(path, records)
+    return path
+
+
+def test_empty_snapshot(tmp_path):
+    snapshot = CatalogSnapshot(build(tmp_path, []))
+    assert snapshot.rows == 0
+    assert snapshot.get("movie", 1) is None
+    assert snapshot.search("anything") == []
+    snapshot.close()
+
+
+def test_round_trip_fields(tmp_path):
+    snapshot = CatalogSnapshot(build(tmp_path, [
+        record("movie", 603, "The Matrix", date="1999-03-31", genres=["Action", "Science Fiction"], popularity=80.5),
+        record("tv", 1396, "Breaking Bad", poster_path=None, genres=[])
+    ]))
+    movie = snapshot.get("movie", 603)
+    assert movie["id"] == 603
+    assert movie["media_type"] == "movie"
+    assert movie["title"] == "The Matrix"
+    assert movie["release_date"] == "1999-03-31"
+    assert movie["overview"] == "About The Matrix"
+    assert movie["poster_path"] == "/603.jpg"
+    assert movie["genres"] == [{"name": "Action"}, {"name": "Science Fiction"}]
+    assert abs(movie["popularity"] - 80.5) < 1e-3
+
+    show = snapshot.get("tv", 1396)
+    assert show["name"] == "Breaking Bad"
+    assert show["first_air_date"] == "2001-01-01"
+    assert show["poster_path"] is None
+    assert show["genres"] == []
+    assert snapshot.get("movie", 1396) is None
+    snapshot.close()
+
+
+def test_same_id_as_movie_and_tv(tmp_path):
+    snapshot = CatalogSnapshot(build(tmp_path, [
+        record("movie", 42, "A Film"),
+        record("tv", 42, "A Series")
+    ]))
+    assert snapshot.rows == 2
+    assert snapshot.get("movie", 42)["title"] == "A Film"
+    assert snapshot.get("tv", 42)["name"] == "A Series"
+    snapshot.close()
+
+
+def test_unicode_titles(tmp_path):
+    snapshot = CatalogSnapshot(build(tmp_path, [
+        record("tv", 1, "進撃の巨人", overview="Humanity's last stand — behind the walls"),
+        record("movie", 2, "Amélie"),
+        record("movie", 3, "Léon: The Professional")
+    ]))
+    assert snapshot.get("tv", 1)["name"] == "進撃の巨人"
+    assert snapshot.get("tv", 1)["overview"] == "Humanity's last stand — behind the walls"
+    assert [match["id"] for match in snapshot.search("進撃の巨人")] == [1]
+    assert [match["id"] for match in snapshot.search("amélie")] == [2]
+    # Punctuation and case are folded
+    assert [match["id"] for match in snapshot.search("LÉON  the professional")] == [3]
+    snapshot.close()
+
+
+def test_search_orders_by_popularity_and_filters(tmp_path):
+    snapshot = CatalogSnapshot(build(tmp_path, [
+        record("movie", 1, "Dune", popularity=10),
+        record("movie", 2, "Dune", popularity=90),
+        record("tv", 3, "Dune", popularity=50),
+        record("movie", 4, "Dunkirk", popularity=99)
+    ]))
+    assert [match["id"] for match in snapshot.search("dune")] == [2, 3, 1]
+    assert [match["id"] for match in snapshot.search("dune", media_type="tv")] == [3]
+    assert [match["id"] for match in snapshot.search("dune", limit=1)] == [2]
+    assert snapshot.search("dun") == []
+    snapshot.close()
+
+
+def test_is_stale_after_swap(tmp_path):
+    path = build(tmp_path, [record("movie", 1, "Old")])
+    snapshot = CatalogSnapshot(path)
+    assert not snapshot.is_stale()
+
+    write_snapshot(path, [record("movie", 1, "New"), record("movie", 2, "Other")])
+    assert snapshot.is_stale()
+    # The old mapping stays readable until it is dropped
+    assert snapshot.get("movie", 1)["title"] == "Old"
+
+    fresh = CatalogSnapshot(path)
+    assert not fresh.is_stale()
+    assert fresh.rows == 2
+    assert fresh.get("movie", 1)["title"] == "New"
+    assert not [name for name in os.listdir(tmp_path) if ".tmp-" in name]
+    snapshot.close()
+    fresh.close()